@@ -1,24 +1,87 @@
 from pathlib import Path
+import hashlib
+import json
+import os
+import shutil
 import sys
 
-from amaranth.back import verilog
 from fusesoc.capi2.generator import Generator
 
 # Provide path to actual ufm_reader module for convenience.
 sys.path += [str(Path(__file__).resolve().parent.parent)]
 
 
+def default_cache_dir():
+    base = os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")
+    return Path(base) / "efbutils" / "amgen"
+
+
+# Hash every Python source that generated Verilog can depend on: the
+# generators themselves and the ufm_reader package.
+def source_hash():
+    root = Path(__file__).resolve().parent.parent
+    h = hashlib.sha256()
+    for d in ("gen", "ufm_reader"):
+        for f in sorted((root / d).rglob("*.py")):
+            h.update(str(f.relative_to(root)).encode())
+            h.update(f.read_bytes())
+
+    return h.hexdigest()
+
+
+# Generated Verilog is cached in AMGEN_CACHE_DIR (default
+# ~/.cache/efbutils/amgen), keyed on the generator class, its parameters,
+# the Amaranth version and the sources above. An unchanged design is copied
+# out of the cache instead of being elaborated and converted again. Set
+# AMGEN_CACHE_DIR to an empty string to disable the cache.
+#
+# FuseSoC starts a new interpreter for every generator, so Amaranth and
+# ufm_reader are only imported once there's something to convert:
+# subclasses import them in create_module, not at the top of the file.
 class AmaranthGenerator(Generator):
     output_file = "top.v"
     module_name = "top"
 
-    def __init__(self):
-        super().__init__()
+    # data is the generator's YAML input as a dictionary; if None, it's read
+    # from the file named on the command line, as FuseSoC does.
+    def __init__(self, data=None):
+        super().__init__(data)
+        # Generator keeps these as class attributes, which would be shared
+        # by every generator run in the same process (see batch.py).
+        self.filesets = {}
+        self.parameters = {}
+        self.targets = {}
 
     def create_module(self):
         raise NotImplementedError("Subclasses are expected to generate an Amaranth module.")  # noqa: E501
 
-    def generate(self):
+    # Files the generated Verilog depends on, besides the sources; their
+    # contents go into the cache key.
+    def input_files(self):
+        return []
+
+    def cache_key(self):
+        import importlib.metadata
+
+        # Not __module__, which is __main__ when run from FuseSoC.
+        script = Path(sys.modules[type(self).__module__].__file__).stem
+        key = {
+            "generator": f"{script}.{type(self).__qualname__}",
+            "config": self.config,
+            "output_file": self.output_file,
+            "module_name": self.module_name,
+            "amaranth": importlib.metadata.version("amaranth"),
+            "sources": source_hash(),
+            "inputs": [hashlib.sha256(Path(f).read_bytes()).hexdigest()
+                       for f in self.input_files()],
+        }
+
+        return hashlib.sha256(json.dumps(key, sort_keys=True,
+                                         default=str).encode()).hexdigest()
+
+    def convert(self):
+        from amaranth.back import verilog
+
         (module, ios) = self.create_module()
 
         with open(self.output_file, "w") as fp:
@@ -26,6 +89,24 @@ class AmaranthGenerator(Generator):
                                          name=self.module_name,
                                          ports=ios)))
 
+    def generate(self):
+        cache_dir = os.environ.get("AMGEN_CACHE_DIR", default_cache_dir())
+
+        if cache_dir:
+            cached = Path(cache_dir) / self.cache_key() / self.output_file
+            if cached.exists():
+                shutil.copyfile(cached, self.output_file)
+            else:
+                self.convert()
+                cached.parent.mkdir(parents=True, exist_ok=True)
+                # Don't leave a partial file behind for another run to pick
+                # up.
+                tmp = cached.with_suffix(f".{os.getpid()}.tmp")
+                shutil.copyfile(self.output_file, tmp)
+                os.replace(tmp, cached)
+        else:
+            self.convert()
+
         files = [{self.output_file: {"file_type": "verilogSource"}}]
         self.add_files(files)
         self.write()
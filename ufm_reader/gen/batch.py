@@ -0,0 +1,128 @@
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import argparse
+import importlib
+import os
+import sys
+import traceback
+
+import yaml
+
+from amgen import AmaranthGenerator
+
+
+# Run many generators in one process (or a pool of them), instead of one
+# interpreter per generator. Each job is a dictionary:
+#
+#   name: Output goes in <output dir>/<name>.
+#   generator: Generator script in this directory, without ".py".
+#   parameters: Same as in a FuseSoC generate section.
+#   vlnv: Optional; names the generated .core file.
+#
+# Jobs come from a YAML list of them, or from the generate section of a
+# FuseSoC core file. As under FuseSoC, generators see the directory of
+# that file as files_root, and resolve input files against it.
+
+
+def load_jobs(filename):
+    with open(filename) as fp:
+        return yaml.safe_load(fp)
+
+
+# Turn each generate entry of a core file into a job, using the generators
+# section to find the script.
+def core_jobs(filename):
+    with open(filename) as fp:
+        core = yaml.safe_load(fp)
+
+    vendor, library, _, version = core["name"].split(":")
+    jobs = []
+    for name, gen in core.get("generate", {}).items():
+        command = core["generators"][gen["generator"]]["command"]
+        jobs.append({
+            "name": name,
+            "generator": Path(command).stem,
+            "parameters": gen.get("parameters", {}),
+            "vlnv": f"{vendor}:{library}:{name}:{version}"
+        })
+
+    return jobs
+
+
+def generator_class(script):
+    module = importlib.import_module(script)
+    for obj in vars(module).values():
+        if isinstance(obj, type) and issubclass(obj, AmaranthGenerator) \
+                and obj.__module__ == module.__name__:
+            return obj
+
+    raise ValueError(f"No AmaranthGenerator in {script}.py")
+
+
+# Returns None on success, or the traceback. files_root defaults to the
+# current directory.
+def run_job(job, output_dir, files_root=None):
+    job_dir = Path(output_dir, job["name"]).resolve()
+    job_dir.mkdir(parents=True, exist_ok=True)
+
+    data = {
+        "files_root": str(Path(files_root or os.getcwd()).resolve()),
+        "vlnv": job.get("vlnv", f"efbutils:batch:{job['name']}:0"),
+        "parameters": job.get("parameters", {})
+    }
+
+    # Generators write to the current directory.
+    cwd = os.getcwd()
+    os.chdir(job_dir)
+    try:
+        generator_class(job["generator"])(data).generate()
+    except Exception:
+        return traceback.format_exc()
+    finally:
+        os.chdir(cwd)
+
+    return None
+
+
+# Returns {name: traceback} for the jobs that failed.
+def run_jobs(jobs, output_dir, processes=1, files_root=None):
+    files_root = Path(files_root or os.getcwd()).resolve()
+    if processes == 1:
+        results = [run_job(job, output_dir, files_root) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            results = list(pool.map(run_job, jobs,
+                                    [output_dir] * len(jobs),
+                                    [files_root] * len(jobs)))
+
+    return {job["name"]: r for job, r in zip(jobs, results) if r is not None}
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Run several Amaranth generators in one go.")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--core", help="run every generate entry in a FuseSoC core file")  # noqa: E501
+    group.add_argument("--jobs", help="YAML list of jobs")
+    parser.add_argument("-o", "--output-dir", default="build",
+                        help="directory to put each job's output under")
+    parser.add_argument("-j", "--processes", type=int, default=1,
+                        help="number of processes to run jobs in")
+    args = parser.parse_args(args)
+
+    if args.core:
+        jobs = core_jobs(args.core)
+    else:
+        jobs = load_jobs(args.jobs)
+    files_root = Path(args.core or args.jobs).parent
+
+    failed = run_jobs(jobs, args.output_dir, args.processes, files_root)
+    for name, tb in failed.items():
+        print(f"{name} failed:\n{tb}", file=sys.stderr)
+
+    print(f"{len(jobs) - len(failed)}/{len(jobs)} jobs succeeded.")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
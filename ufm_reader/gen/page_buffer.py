@@ -1,18 +1,22 @@
 from amgen import AmaranthGenerator
 
-from ufm_reader.page_buffer import PageBuffer
-
 
 class PageBufferGenerator(AmaranthGenerator):
     output_file = "page_buffer.v"
     module_name = "page_buffer"
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, data=None):
+        super().__init__(data)
+        self.prefetch = self.config.get("prefetch", "off")
+        self.max_page = self.config.get("max_page", 2047)
+        self.width = self.config.get("width", 8)
 
     # Generate a core to be included in another project.
     def create_module(self):
-        m = PageBuffer()
+        from ufm_reader.page_buffer import PageBuffer
+
+        m = PageBuffer(prefetch=self.prefetch, max_page=self.max_page,
+                       width=self.width)
         ios = [m.rand.data, m.rand.addr, m.rand.read_en,
                m.rand.flush, m.rand.valid, m.seq.data,
                m.seq.addr, m.seq.stb, m.seq.ack]
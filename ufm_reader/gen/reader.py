@@ -1,21 +1,73 @@
-from amgen import AmaranthGenerator
+from pathlib import Path
 
-from ufm_reader.reader import Reader
+from amgen import AmaranthGenerator
 
 
 class ReaderGenerator(AmaranthGenerator):
     output_file = "reader.v"
     module_name = "reader"
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, data=None):
+        super().__init__(data)
+        self.session_timeout = self.config.get("session_timeout", None)
+        self.pipelined = self.config.get("pipelined", False)
+        self.prefetch = self.config.get("prefetch", "off")
+        self.max_page = self.config.get("max_page", 2047)
+        self.cache = self.config.get("cache", None)
+        self.stream = self.config.get("stream", False)
+        self.width = self.config.get("width", 8)
+        self.perf = self.config.get("perf", False)
+        # {index: <index file from ufm_reader.image>, base_page: <page>}.
+        # A relative index is found in files_root.
+        self.decompress = self.config.get("decompress", None)
+        # {init_mem: <UFM init file>, start_page: <page>, min_pages: <n>},
+        # as in ufm_config, with init_mem found in files_root if relative.
+        # Pages of the image that hold a single value are read without going
+        # to the UFM.
+        self.uniform = self.config.get("uniform", None)
+
+    def input_files(self):
+        files = []
+        if self.decompress:
+            files.append(Path(self.files_root, self.decompress["index"]))
+        if self.uniform:
+            files.append(Path(self.files_root, self.uniform["init_mem"]))
+        return files
 
     # Generate a core to be included in another project.
     def create_module(self):
-        m = Reader()
+        from ufm_reader.image import load_index, uniform_runs
+        from ufm_reader.reader import Reader
+        from ufm_reader.sim import load_mem
+
+        decompress = None
+        if self.decompress:
+            index = Path(self.files_root, self.decompress["index"])
+            decompress = {
+                "index": load_index(index),
+                "base_page": self.decompress["base_page"]
+            }
+
+        uniform = ()
+        if self.uniform:
+            init_mem = Path(self.files_root, self.uniform["init_mem"])
+            uniform = uniform_runs(load_mem(init_mem),
+                                   self.uniform.get("start_page", 0),
+                                   self.uniform.get("min_pages", 1))
+
+        m = Reader(session_timeout=self.session_timeout,
+                   pipelined=self.pipelined, prefetch=self.prefetch,
+                   max_page=self.max_page, cache=self.cache,
+                   stream=self.stream, width=self.width, perf=self.perf,
+                   decompress=decompress, uniform=uniform)
         ios = [m.bus.data, m.bus.addr, m.bus.read_en, m.bus.valid,
                m.bus.stall, m.efb.cyc, m.efb.stb, m.efb.we, m.efb.adr,
                m.efb.dat_w, m.efb.dat_r, m.efb.ack]
+        if self.stream:
+            ios += [m.cmd.addr, m.cmd.len, m.cmd.valid, m.cmd.ready,
+                    m.src.data, m.src.valid, m.src.ready]
+        if self.perf:
+            ios += [m.perf.addr, m.perf.data, m.perf.clear]
 
         return (m, ios)
 
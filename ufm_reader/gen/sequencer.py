@@ -0,0 +1,27 @@
+from amgen import AmaranthGenerator
+
+
+class SequencerGenerator(AmaranthGenerator):
+    output_file = "sequencer.v"
+    module_name = "sequencer"
+
+    def __init__(self, data=None):
+        super().__init__(data)
+        self.pipelined = self.config.get("pipelined", False)
+
+    # Generate a core to be included in another project.
+    def create_module(self):
+        from ufm_reader.sequencer import Sequencer, Wrapper
+
+        m = Wrapper(Sequencer(pipelined=self.pipelined))
+        ios = [m.ctl.req, m.ctl.cmd, m.ctl.done, m.ctl.op_len,
+               m.ctl.data_len, m.ctl.xfer_is_wr, m.wr.data, m.wr.ready,
+               m.wr.valid, m.rd.data, m.rd.stb, m.rd.ready, m.efb.cyc,
+               m.efb.stb, m.efb.we, m.efb.adr, m.efb.dat_w, m.efb.dat_r,
+               m.efb.ack]
+
+        return (m, ios)
+
+
+if __name__ == "__main__":
+    SequencerGenerator().generate()
@@ -0,0 +1,31 @@
+from amgen import AmaranthGenerator
+
+
+class ShadowGenerator(AmaranthGenerator):
+    output_file = "shadow.v"
+    module_name = "shadow"
+
+    def __init__(self, data=None):
+        super().__init__(data)
+        self.start_page = self.config["start_page"]
+        self.num_pages = self.config["num_pages"]
+        self.width = self.config.get("width", 8)
+        self.pipelined = self.config.get("pipelined", True)
+        self.dummy_bytes = self.config.get("dummy_bytes", 0)
+
+    # Generate a core to be included in another project.
+    def create_module(self):
+        from ufm_reader.shadow import Shadow
+
+        m = Shadow(start_page=self.start_page, num_pages=self.num_pages,
+                   width=self.width, pipelined=self.pipelined,
+                   dummy_bytes=self.dummy_bytes)
+        ios = [m.rand.data, m.rand.addr, m.rand.read_en, m.rand.flush,
+               m.rand.valid, m.ready, m.efb.cyc, m.efb.stb, m.efb.we,
+               m.efb.adr, m.efb.dat_w, m.efb.dat_r, m.efb.ack]
+
+        return (m, ios)
+
+
+if __name__ == "__main__":
+    ShadowGenerator().generate()
@@ -1,21 +1,38 @@
 from amgen import AmaranthGenerator
 
-from ufm_reader.streamer import Streamer
-
 
 class StreamerGenerator(AmaranthGenerator):
     output_file = "streamer.v"
     module_name = "streamer"
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, data=None):
+        super().__init__(data)
+        self.session_timeout = self.config.get("session_timeout", None)
+        self.pages = self.config.get("pages", 1)
+        self.dummy_bytes = self.config.get("dummy_bytes", 0)
+        self.pipelined = self.config.get("pipelined", False)
+        self.busy_wait = self.config.get("busy_wait", "poll")
+        self.backoff = self.config.get("backoff", 64)
+        self.max_backoff = self.config.get("max_backoff", None)
+        self.track_addr = self.config.get("track_addr", True)
+        self.poll_status = self.config.get("poll_status", False)
 
     # Generate a core to be included in another project.
     def create_module(self):
-        m = Streamer()
+        from ufm_reader.streamer import Streamer
+
+        m = Streamer(session_timeout=self.session_timeout, pages=self.pages,
+                     dummy_bytes=self.dummy_bytes, pipelined=self.pipelined,
+                     busy_wait=self.busy_wait, backoff=self.backoff,
+                     max_backoff=self.max_backoff,
+                     track_addr=self.track_addr,
+                     poll_status=self.poll_status)
         ios = [m.stream.data, m.stream.addr, m.stream.stb, m.stream.ack,
-               m.stream.stall, m.stream.ready, m.efb.cyc, m.efb.stb, m.efb.we,
-               m.efb.adr, m.efb.dat_w, m.efb.dat_r, m.efb.ack]
+               m.stream.stall, m.stream.ready, m.stream.release,
+               m.stream.pages, m.stream.op, m.stream.wr_data,
+               m.stream.wr_valid, m.stream.wr_ready, m.efb.cyc, m.efb.stb,
+               m.efb.we, m.efb.adr, m.efb.dat_w, m.efb.dat_r, m.efb.ack,
+               m.efb.irq]
 
         return (m, ios)
 
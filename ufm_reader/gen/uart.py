@@ -1,18 +1,18 @@
 from amgen import AmaranthGenerator
 
-from amaranth_stdio import serial
-
 
 class UartGenerator(AmaranthGenerator):
     output_file = "uart.v"
     module_name = "uart"
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, data=None):
+        super().__init__(data)
         self.divisor = self.config.get('divisor', None)
 
     # Generate a core to be included in another project.
     def create_module(self):
+        from amaranth_stdio import serial
+
         m = serial.AsyncSerial(divisor=self.divisor)
 
         m.tx.o.name = "tx"
@@ -0,0 +1,34 @@
+from amgen import AmaranthGenerator
+
+
+class WishboneReaderGenerator(AmaranthGenerator):
+    output_file = "wishbone_reader.v"
+    module_name = "wishbone_reader"
+
+    def __init__(self, data=None):
+        super().__init__(data)
+        self.width = self.config.get("width", 32)
+        self.burst_len = self.config.get("burst_len", 64)
+        self.session_timeout = self.config.get("session_timeout", None)
+        self.pipelined = self.config.get("pipelined", False)
+        self.prefetch = self.config.get("prefetch", "off")
+        self.cache = self.config.get("cache", None)
+
+    # Generate a core to be included in another project.
+    def create_module(self):
+        from ufm_reader.wishbone import WishboneReader
+
+        m = WishboneReader(width=self.width, burst_len=self.burst_len,
+                           session_timeout=self.session_timeout,
+                           pipelined=self.pipelined, prefetch=self.prefetch,
+                           cache=self.cache)
+        ios = [m.bus.cyc, m.bus.stb, m.bus.we, m.bus.adr, m.bus.sel,
+               m.bus.dat_w, m.bus.dat_r, m.bus.cti, m.bus.bte, m.bus.ack,
+               m.bus.err, m.efb.cyc, m.efb.stb, m.efb.we, m.efb.adr,
+               m.efb.dat_w, m.efb.dat_r, m.efb.ack]
+
+        return (m, ios)
+
+
+if __name__ == "__main__":
+    WishboneReaderGenerator().generate()
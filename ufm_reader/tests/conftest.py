@@ -1,3 +1,5 @@
+import json
+
 import pytest
 
 from amaranth.sim import Simulator
@@ -9,6 +11,14 @@ def pytest_addoption(parser):
         action="store_true",
         help="generate Value Change Dump (vcds) from simulations",
     )
+    parser.addoption(
+        "--bench-json",
+        help="write benchmark results to this JSON file",
+    )
+    parser.addoption(
+        "--bench-baseline",
+        help="fail benchmarks more than 5%% slower than in this JSON file",
+    )
 
 
 class SimulatorFixture:
@@ -39,3 +49,37 @@ class SimulatorFixture:
 def sim_mod(request, pytestconfig):
     simfix = SimulatorFixture(request, pytestconfig)
     return (simfix, simfix.mod)
+
+
+# Collects results from the benchmarks as {name: {metric: value}}. All
+# metrics are lower-is-better, and are compared against the baseline (if
+# any) as they are recorded.
+class BenchResults:
+    tolerance = 0.05
+
+    def __init__(self, baseline):
+        self.results = {}
+        self.baseline = {}
+        if baseline:
+            with open(baseline) as fp:
+                self.baseline = json.load(fp)
+
+    def record(self, name, **metrics):
+        self.results[name] = metrics
+
+        for metric, value in metrics.items():
+            old = self.baseline.get(name, {}).get(metric)
+            if old is not None:
+                assert value <= old * (1 + self.tolerance), \
+                    f"{name}: {metric} regressed from {old} to {value}"
+
+
+@pytest.fixture(scope="session")
+def bench(pytestconfig):
+    results = BenchResults(pytestconfig.getoption("bench_baseline"))
+    yield results
+
+    filename = pytestconfig.getoption("bench_json")
+    if filename:
+        with open(filename, "w") as fp:
+            json.dump(results.results, fp, indent=2, sort_keys=True)
@@ -0,0 +1,192 @@
+from pathlib import Path
+import subprocess
+import sys
+
+import pytest
+import yaml
+from amaranth.back import verilog
+
+import amgen
+from gen.page_buffer import PageBufferGenerator
+from gen.reader import ReaderGenerator
+
+
+# Stand-in for verilog.convert (which needs Yosys), counting conversions.
+@pytest.fixture
+def converts(monkeypatch):
+    calls = []
+
+    def convert(module, name, ports):
+        calls.append(name)
+        return f"// {name} {len(calls)}\n"
+
+    monkeypatch.setattr(verilog, "convert", convert)
+    return calls
+
+
+def run_generator(tmp_path, monkeypatch, parameters):
+    cfg = tmp_path / "cfg.yml"
+    cfg.write_text(yaml.dump({
+        "files_root": str(tmp_path),
+        "vlnv": "cr1901:efbutils:page_buffer:0",
+        "parameters": parameters
+    }))
+    monkeypatch.setattr(sys, "argv", ["page_buffer.py", str(cfg)])
+
+    PageBufferGenerator().generate()
+    return (tmp_path / "page_buffer.v").read_text()
+
+
+def test_cache(tmp_path, monkeypatch, converts):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("AMGEN_CACHE_DIR", str(tmp_path / "cache"))
+
+    first = run_generator(tmp_path, monkeypatch, {"prefetch": "next"})
+    again = run_generator(tmp_path, monkeypatch, {"prefetch": "next"})
+    assert converts == ["page_buffer"]
+    assert again == first
+
+    other = run_generator(tmp_path, monkeypatch, {"prefetch": "stride"})
+    assert len(converts) == 2
+    assert other != first
+
+    # Any change to the sources invalidates everything.
+    monkeypatch.setattr(amgen, "source_hash", lambda: "edited")
+    run_generator(tmp_path, monkeypatch, {"prefetch": "next"})
+    assert len(converts) == 3
+
+
+def test_cache_disabled(tmp_path, monkeypatch, converts):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("AMGEN_CACHE_DIR", "")
+
+    run_generator(tmp_path, monkeypatch, {})
+    run_generator(tmp_path, monkeypatch, {})
+    assert len(converts) == 2
+
+
+# The reader's decompression index is read from a file, which isn't part of
+# its parameters.
+def test_cache_input_files(tmp_path, monkeypatch, converts):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("AMGEN_CACHE_DIR", str(tmp_path / "cache"))
+
+    index = tmp_path / "init.mem.idx"
+    data = {
+        "files_root": str(tmp_path),
+        "vlnv": "cr1901:efbutils:reader:0",
+        "parameters": {"decompress": {"index": str(index), "base_page": 0}}
+    }
+
+    index.write_text("0000 02\n")
+    ReaderGenerator(data).generate()
+    ReaderGenerator(data).generate()
+    assert len(converts) == 1
+
+    index.write_text("0000 02\n0000 02\n")
+    ReaderGenerator(data).generate()
+    assert len(converts) == 2
+
+
+# FuseSoC runs generators in the build directory, so a relative index is
+# found in files_root (the directory of the core), not the working directory.
+def test_relative_index(tmp_path, monkeypatch, converts):
+    (tmp_path / "build").mkdir()
+    monkeypatch.chdir(tmp_path / "build")
+    monkeypatch.setenv("AMGEN_CACHE_DIR", str(tmp_path / "cache"))
+
+    index = tmp_path / "init.mem.idx"
+    data = {
+        "files_root": str(tmp_path),
+        "vlnv": "cr1901:efbutils:reader:0",
+        "parameters": {"decompress": {"index": "init.mem.idx",
+                                      "base_page": 0}}
+    }
+
+    index.write_text("0000 02\n")
+    ReaderGenerator(data).generate()
+    assert len(converts) == 1
+
+    index.write_text("0000 02\n0000 02\n")
+    ReaderGenerator(data).generate()
+    assert len(converts) == 2
+
+
+def test_relative_init_mem(tmp_path, monkeypatch, converts):
+    (tmp_path / "build").mkdir()
+    monkeypatch.chdir(tmp_path / "build")
+    monkeypatch.setenv("AMGEN_CACHE_DIR", str(tmp_path / "cache"))
+
+    init_mem = tmp_path / "init.mem"
+    data = {
+        "files_root": str(tmp_path),
+        "vlnv": "cr1901:efbutils:reader:0",
+        "parameters": {"uniform": {"init_mem": "init.mem"}}
+    }
+
+    init_mem.write_text(("00" * 16 + "\n") * 2)
+    ReaderGenerator(data).generate()
+    assert len(converts) == 1
+
+    init_mem.write_text(("00" * 16 + "\n") * 3)
+    ReaderGenerator(data).generate()
+    assert len(converts) == 2
+
+
+def test_reader_parameters():
+    (m, ios) = ReaderGenerator({
+        "files_root": ".",
+        "vlnv": "cr1901:efbutils:reader:0",
+        "parameters": {"stream": True, "session_timeout": 16,
+                       "pipelined": True, "prefetch": "next",
+                       "max_page": 100}
+    }).create_module()
+
+    assert m.streammod.session_timeout == 16
+    assert m.pagemod.max_page == 100
+    for port in [m.cmd.addr, m.cmd.len, m.cmd.valid, m.cmd.ready,
+                 m.src.data, m.src.valid, m.src.ready]:
+        assert any(port is io for io in ios)
+
+
+GENERATORS = ["demo", "efb", "page_buffer", "reader", "sequencer",
+              "shadow", "streamer", "uart", "wishbone"]
+
+
+# Microseconds to import a generator script, on top of FuseSoC itself
+# (which every generator needs), and whether that pulled in Amaranth.
+# Best of a few runs, to keep other load on the machine out of it.
+def import_time(script):
+    gen_dir = Path(__file__).resolve().parent.parent / "gen"
+    best = None
+    for _ in range(3):
+        code = f"import fusesoc.capi2.generator; import {script}"
+        res = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                             cwd=gen_dir, capture_output=True, text=True,
+                             check=True)
+        times = {}
+        for line in res.stderr.splitlines():
+            _, cumulative, name = line.split("|")
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative)
+
+        assert not any(m == "amaranth" or m.startswith("amaranth.")
+                       for m in times)
+        if best is None or times[script] < best:
+            best = times[script]
+
+    return best
+
+
+@pytest.mark.parametrize("script", GENERATORS)
+def test_no_amaranth_import(script):
+    import_time(script)
+
+
+# Measured at about 16ms for each script; importing Amaranth and
+# ufm_reader up front took about 110ms. Wall-clock, so only run with the
+# benchmarks.
+@pytest.mark.bench
+@pytest.mark.parametrize("script", GENERATORS)
+def test_import_time(script):
+    assert import_time(script) < 50000
@@ -0,0 +1,79 @@
+from pathlib import Path
+
+import yaml
+
+import amgen
+import batch
+
+from test_amgen import converts  # noqa: F401
+
+
+JOBS = [
+    {"name": "pb_next", "generator": "page_buffer",
+     "parameters": {"prefetch": "next"}},
+    {"name": "pb_plain", "generator": "page_buffer", "parameters": {}},
+    {"name": "reader", "generator": "reader",
+     "parameters": {"cache": {"lines": 8, "ways": 2}}},
+    {"name": "streamer", "generator": "streamer",
+     "parameters": {"busy_wait": "backoff"}},
+]
+
+
+def test_run_jobs(tmp_path, monkeypatch, converts):  # noqa: F811
+    monkeypatch.setenv("AMGEN_CACHE_DIR", str(tmp_path / "cache"))
+
+    assert batch.run_jobs(JOBS, tmp_path / "out") == {}
+    assert len(converts) == len(JOBS)
+
+    for job in JOBS:
+        job_dir = tmp_path / "out" / job["name"]
+        core = yaml.safe_load((job_dir / f"{job['name']}.core").read_text())
+        # Each job's .core only lists its own files.
+        (fileset,) = core["filesets"].values()
+        (file,) = fileset["files"]
+        assert (job_dir / next(iter(file))).exists()
+
+    # Second run comes from the cache.
+    assert batch.run_jobs(JOBS, tmp_path / "again") == {}
+    assert len(converts) == len(JOBS)
+
+
+def test_run_jobs_failure(tmp_path, monkeypatch, converts):  # noqa: F811
+    monkeypatch.setenv("AMGEN_CACHE_DIR", "")
+
+    jobs = [
+        {"name": "bad", "generator": "page_buffer",
+         "parameters": {"width": 12}},
+        {"name": "good", "generator": "page_buffer", "parameters": {}},
+    ]
+    failed = batch.run_jobs(jobs, tmp_path)
+    assert list(failed) == ["bad"]
+    assert "ValueError" in failed["bad"]
+    assert converts == ["page_buffer"]
+
+
+def test_files_root(tmp_path, monkeypatch):
+    roots = []
+    monkeypatch.setattr(amgen.AmaranthGenerator, "generate",
+                        lambda self: roots.append(self.files_root))
+    monkeypatch.chdir(tmp_path)
+
+    jobs = JOBS[:1]
+    batch.run_jobs(jobs, tmp_path / "out")
+    batch.run_jobs(jobs, tmp_path / "out", files_root="inputs")
+    # Inputs are looked for where the jobs came from, not in the job's
+    # output directory.
+    assert roots == [str(tmp_path), str(tmp_path / "inputs")]
+
+
+def test_core_jobs():
+    jobs = {j["name"]: j for j in batch.core_jobs(
+        Path(__file__).parent.parent / "ufm_reader.core")}
+
+    assert jobs["sim_uart"] == {
+        "name": "sim_uart",
+        "generator": "uart",
+        "parameters": {"divisor": 21},
+        "vlnv": "cr1901:efbutils:sim_uart:0.0.1"
+    }
+    assert jobs["demo_lcmxo2_7000he_b_evn"]["generator"] == "demo"
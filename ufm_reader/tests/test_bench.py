@@ -0,0 +1,181 @@
+import math
+import random
+
+import pytest
+from amaranth.sim import Simulator
+
+from ufm_reader.efb import UFM_END_PAGE
+from ufm_reader.reader import Reader
+from ufm_reader.sequencer import Sequencer, Wrapper
+from ufm_reader.shadow import Shadow, max_shadow_pages
+from ufm_reader.sim import EfbModel
+from ufm_reader.streamer import Streamer
+
+from test_sequencer import read_ufm_cycles
+from test_streamer import read_pages
+
+
+# Cycle counts for the reader stack against the EFB model. Run with
+# --bench-json to save the results, and --bench-baseline to compare them
+# against a previous run. -s prints a summary.
+pytestmark = pytest.mark.bench
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[max(math.ceil(p / 100 * len(values)) - 1, 0)]
+
+
+def summarize(latencies, cycles, num_bytes):
+    return {
+        "cycles_per_byte": round(cycles / num_bytes, 3),
+        "p50": percentile(latencies, 50),
+        "p99": percentile(latencies, 99),
+    }
+
+
+def simulate(dut, *procs):
+    sim = Simulator(dut)
+    sim.add_clock(1.0 / 12e6)
+    for p in procs:
+        sim.add_sync_process(p)
+    sim.run()
+
+
+NUM_READS = 64
+rng = random.Random(0)
+PATTERNS = {
+    "linear": list(range(NUM_READS)),
+    "strided": [48 * i for i in range(NUM_READS)],
+    "random": [rng.randrange(2048) for _ in range(NUM_READS)],
+    "same_page": [rng.randrange(16) for _ in range(NUM_READS)],
+}
+
+READERS = {
+    "oneshot": {},
+    "session_pipelined": {"session_timeout": 32, "pipelined": True},
+    "prefetch_stride": {"session_timeout": 32, "pipelined": True,
+                        "prefetch": "stride"},
+    "cache": {"session_timeout": 32, "pipelined": True,
+              "cache": {"lines": 8, "ways": 2}},
+}
+
+
+# Latency is from read_en to valid, inclusive. Each read is followed by an
+# idle cycle, which counts towards cycles/byte.
+@pytest.mark.parametrize("config", READERS)
+@pytest.mark.parametrize("pattern", PATTERNS)
+def test_bench_reader(bench, config, pattern):
+    rdr = Reader(**READERS[config])
+    addrs = PATTERNS[pattern]
+    latencies = []
+
+    def proc():
+        for addr in addrs:
+            yield rdr.bus.addr.eq(addr)
+            yield rdr.bus.read_en.eq(1)
+            yield
+
+            cycles = 1
+            while not (yield rdr.bus.valid):
+                yield
+                cycles += 1
+            assert (yield rdr.bus.data) == addr & 0xff
+            latencies.append(cycles)
+
+            yield rdr.bus.read_en.eq(0)
+            yield
+
+    simulate(rdr, proc, EfbModel(rdr.efb, fill=lambda addr: addr).process)
+
+    result = summarize(latencies, sum(latencies) + len(addrs), len(addrs))
+    print(f"reader {config} {pattern}: {result}")
+    bench.record(f"reader_{config}_{pattern}", **result)
+
+
+STREAMERS = {
+    "oneshot": {},
+    "session": {"session_timeout": 8},
+    "session_pipelined": {"session_timeout": 8, "pipelined": True},
+    "burst_pipelined": {"pages": 8, "pipelined": True},
+}
+
+
+# 16 linear pages, one request per stream.pages pages. Latency is from the
+# request to its first byte.
+@pytest.mark.parametrize("config", STREAMERS)
+def test_bench_streamer(bench, config):
+    streamer = Streamer(**STREAMERS[config])
+    latencies = []
+    data = []
+
+    simulate(streamer,
+             read_pages(streamer, 16, data,
+                        pages=STREAMERS[config].get("pages", 0),
+                        latencies=latencies),
+             EfbModel(streamer.efb, fill=lambda addr: addr).process)
+
+    result = summarize(latencies, data[-1], 16 * 16)
+    print(f"streamer {config}: {result}")
+    bench.record(f"streamer_{config}", **result)
+
+
+@pytest.mark.parametrize("pipelined", [False, True])
+def test_bench_sequencer(bench, pipelined):
+    seq = Wrapper(Sequencer(pipelined=pipelined))
+    result = []
+    simulate(seq, read_ufm_cycles(seq, result),
+             EfbModel(seq.efb, fill=lambda addr: addr).process)
+
+    cycles, _ = result
+    name = "pipelined" if pipelined else "basic"
+    print(f"sequencer {name}: {cycles} cycles per READ_UFM")
+    bench.record(f"sequencer_{name}", cycles_per_read_ufm=cycles,
+                 cycles_per_byte=round(cycles / 16, 3))
+
+
+# Cycles from reset until a Shadow of num_pages pages, at the end of the
+# UFM, is ready.
+def shadow_copy_cycles(dev_density, num_pages):
+    start_page = UFM_END_PAGE[dev_density] + 1 - num_pages
+    shadow = Shadow(start_page=start_page, num_pages=num_pages)
+    total = []
+
+    def proc():
+        cycles = 0
+        while not (yield shadow.ready):
+            yield
+            cycles += 1
+        total.append(cycles)
+
+        # Spot check the last byte.
+        last = (start_page + num_pages) * 16 - 1
+        yield shadow.rand.addr.eq(last)
+        yield shadow.rand.read_en.eq(1)
+        yield
+        yield
+        assert (yield shadow.rand.valid)
+        assert (yield shadow.rand.data) == last & 0xff
+
+    simulate(shadow, proc,
+             EfbModel(shadow.efb, fill=lambda addr: addr).process)
+    return total[0]
+
+
+# Time to copy the largest region that fits in EBR, on the biggest and
+# smallest common parts. The copy is a single READ_UFM, so its time is
+# linear in the number of pages; simulating the whole region would take
+# minutes, so it's worked out from two small ones (which agreed with a
+# full simulation exactly).
+@pytest.mark.parametrize("dev_density", ["7000L", "1200L"])
+def test_bench_shadow(bench, dev_density):
+    num_pages = max_shadow_pages(dev_density)
+    small = shadow_copy_cycles(dev_density, 8)
+    large = shadow_copy_cycles(dev_density, 16)
+    per_page = (large - small) / 8
+    cycles = round(small + (num_pages - 8) * per_page)
+
+    print(f"shadow {dev_density}: {num_pages} pages in {cycles} cycles "
+          f"({cycles / 12e3:.2f} ms at 12 MHz)")
+    bench.record(f"shadow_{dev_density}", copy_cycles=cycles,
+                 cycles_per_byte=round(per_page / 16, 3))
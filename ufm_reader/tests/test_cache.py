@@ -0,0 +1,91 @@
+import pytest
+
+from ufm_reader.cache import Cache, Replacement
+
+from test_page_buffer import page_byte, seq_proc, read_proc
+
+
+# Returns the pages requested from the sequencer side, and the hit/miss
+# counters at the end.
+def run_reads(sim, cache, addrs):
+    log = []
+    result = []
+    stats = []
+
+    def proc():
+        yield from read_proc(cache, addrs, result)()
+        stats.append((yield cache.stats.hits))
+        stats.append((yield cache.stats.misses))
+
+    sim.run(sync_processes=[proc, seq_proc(cache, log)])
+
+    assert [d for (d, _) in result] == \
+        [page_byte(a >> 4, a & 0xf) for a in addrs]
+    return log, tuple(stats)
+
+
+# Header page plus a table spread over three other pages.
+SCATTERED = [0, 1, 512, 2, 1024, 3, 1536, 4, 513, 5, 1025, 6, 1537]
+
+
+@pytest.mark.module(Cache(lines=4, ways=4))
+@pytest.mark.clks((1.0 / 12e6,))
+def test_fully_associative(sim_mod):
+    sim, cache = sim_mod
+    log, stats = run_reads(sim, cache, SCATTERED)
+
+    assert log == [0, 32, 64, 96]
+    assert stats == (len(SCATTERED) - 4, 4)
+
+
+@pytest.mark.module(Cache(lines=4, ways=1))
+@pytest.mark.clks((1.0 / 12e6,))
+def test_direct_mapped_conflicts(sim_mod):
+    sim, cache = sim_mod
+    # Pages 0, 32, 64, 96 all map onto set 0.
+    log, stats = run_reads(sim, cache, SCATTERED)
+
+    assert log == [0, 32, 0, 64, 0, 96, 0, 32, 0, 64, 0, 96]
+    assert stats == (1, 12)
+
+
+@pytest.mark.module(Cache(lines=2, ways=2, replacement=Replacement.LRU))
+@pytest.mark.clks((1.0 / 12e6,))
+def test_lru(sim_mod):
+    sim, cache = sim_mod
+    # Page 0 is used again before page 2 comes in, so page 1 gets evicted.
+    log, _ = run_reads(sim, cache, [0, 16, 1, 32, 2, 17])
+
+    assert log == [0, 1, 2, 1]
+
+
+@pytest.mark.module(Cache(lines=2, ways=2, replacement="round_robin"))
+@pytest.mark.clks((1.0 / 12e6,))
+def test_round_robin(sim_mod):
+    sim, cache = sim_mod
+    # Lines are evicted in the order they were filled, regardless of use.
+    log, _ = run_reads(sim, cache, [0, 16, 1, 32, 2, 17])
+
+    assert log == [0, 1, 2, 0, 1]
+
+
+def test_bad_geometry():
+    with pytest.raises(ValueError):
+        Cache(lines=6, ways=4)
+
+
+@pytest.mark.module(Cache(lines=2, ways=2, width=32))
+@pytest.mark.clks((1.0 / 12e6,))
+def test_width_32(sim_mod):
+    sim, cache = sim_mod
+    log = []
+    result = []
+    addrs = [0, 4, 8, 12, 16, 0]
+    sim.run(sync_processes=[read_proc(cache, addrs, result),
+                            seq_proc(cache, log)])
+
+    assert [d for (d, _) in result] == \
+        [sum(page_byte(a >> 4, (a & 0xf) + i) << (8 * i) for i in range(4))
+         for a in addrs]
+    assert log == [0, 1]
+    assert [c for (_, c) in result][1:4] == [min(c for (_, c) in result)] * 3
@@ -0,0 +1,145 @@
+import random
+
+import pytest
+from amaranth.sim import Simulator
+
+from ufm_reader.image import compress, rle_decode, rle_encode
+from ufm_reader.reader import Reader
+from ufm_reader.sequencer import Name
+from ufm_reader.sim import EfbModel
+
+
+def make_image(num_pages):
+    rng = random.Random(0)
+    kinds = [
+        lambda: [0] * 16,
+        lambda: list(b"Hello, UFM world"),
+        lambda: [rng.randrange(256) for _ in range(16)],
+        lambda: [rng.randrange(3)] * rng.randrange(1, 16) + [0xff] * 16,
+        lambda: sum(([rng.randrange(256)] * 4 for _ in range(4)), []),
+    ]
+    return [rng.choice(kinds)()[:16] for _ in range(num_pages)]
+
+
+def test_rle():
+    for page in make_image(200):
+        block = rle_encode(page)
+        assert rle_decode(block + b"\xff") == (bytes(page), len(block))
+
+    assert len(rle_encode([7] * 16)) == 2
+    assert len(rle_encode(range(16))) == 17
+
+
+def test_compress():
+    pages = make_image(64)
+    (data, index) = compress(pages)
+
+    assert len(data) < 16 * len(pages)
+    for page, (offset, length) in zip(pages, index):
+        assert rle_decode(data[offset:offset + length]) == \
+            (bytes(page), length)
+    # Identical pages share a block.
+    assert len(set(index)) == len(set(map(bytes, pages)))
+
+
+def load_ufm(efb, data, base_page):
+    data += bytes(-len(data) % 16)
+    for i in range(0, len(data), 16):
+        efb.ufm[base_page + i // 16] = list(data[i:i + 16])
+
+
+# Read each address in addrs, with an idle cycle after each; returns the
+# bytes read and the cycles taken.
+def run_reads(rdr, efb, addrs):
+    result = []
+
+    def proc():
+        cycles = 0
+        for addr in addrs:
+            yield rdr.bus.addr.eq(addr)
+            yield rdr.bus.read_en.eq(1)
+            yield
+            cycles += 1
+            while not (yield rdr.bus.valid):
+                yield
+                cycles += 1
+            result.append((yield rdr.bus.data))
+            yield rdr.bus.read_en.eq(0)
+            yield
+            cycles += 1
+        result.append(cycles)
+
+    sim = Simulator(rdr)
+    sim.add_clock(1.0 / 12e6)
+    sim.add_sync_process(proc)
+    sim.add_sync_process(efb.process)
+    sim.run()
+
+    return (result[:-1], result[-1])
+
+
+@pytest.mark.parametrize("config", [
+    {},
+    {"session_timeout": 16, "pipelined": True, "prefetch": "next"},
+    {"session_timeout": 16, "cache": {"lines": 4, "ways": 2}},
+])
+def test_reader(config):
+    pages = make_image(48)
+    flat = [b for page in pages for b in page]
+    (data, index) = compress(pages)
+
+    rdr = Reader(decompress={"index": index, "base_page": 100}, **config)
+    efb = EfbModel(rdr.efb)
+    load_ufm(efb, data, 100)
+
+    rng = random.Random(1)
+    addrs = list(range(0, 16 * 8)) + \
+        [rng.randrange(len(flat)) for _ in range(64)]
+    (result, _) = run_reads(rdr, efb, addrs)
+
+    assert result == [flat[a] for a in addrs]
+
+
+# Linear scan of the same image, compressed and not. A compressed page
+# needs less than one UFM page read on average, but up to two.
+@pytest.mark.parametrize("session_timeout", [None, 64])
+def test_scan_cycles(session_timeout):
+    pages = make_image(32)
+    flat = [b for page in pages for b in page]
+    (data, index) = compress(pages)
+    addrs = range(len(flat))
+
+    raw = Reader(session_timeout=session_timeout)
+    raw_efb = EfbModel(raw.efb)
+    load_ufm(raw_efb, bytes(flat), 0)
+    (raw_result, raw_cycles) = run_reads(raw, raw_efb, addrs)
+
+    rdr = Reader(session_timeout=session_timeout,
+                 decompress={"index": index, "base_page": 100})
+    efb = EfbModel(rdr.efb)
+    load_ufm(efb, data, 100)
+    (result, cycles) = run_reads(rdr, efb, addrs)
+
+    assert result == raw_result == flat
+    raw_reads = raw_efb.log.count(Name.READ_UFM)
+    reads = efb.log.count(Name.READ_UFM)
+    print(f"{len(pages)} pages in {-(-len(data) // 16)}; "
+          f"READ_UFMs raw {raw_reads}, compressed {reads}; "
+          f"cycles raw {raw_cycles}, compressed {cycles}")
+
+    assert len(data) < len(flat) // 2
+    assert reads < raw_reads
+    # Without a session, each READ_UFM costs a whole config
+    # enable/disable, so doing fewer of them wins outright.
+    if session_timeout is None:
+        assert cycles < raw_cycles
+
+
+def test_stream_rejected():
+    with pytest.raises(ValueError):
+        Reader(stream=True, decompress={"index": [(0, 2)]})
+
+
+def test_uniform_rejected():
+    with pytest.raises(ValueError, match="compressed image"):
+        Reader(decompress={"index": [(0, 2)]}, uniform=[(1, 2, 0xa5)])
@@ -0,0 +1,194 @@
+import io
+import os
+import struct
+
+import pytest
+
+from ufm_reader.image import convert, load_index, read_elf, read_ihex, \
+    rle_decode, uniform_runs, write_mem
+from ufm_reader.sim import load_mem
+
+
+INIT_MEM_FILE = os.path.join(os.path.dirname(__file__), "..", "data",
+                             "init.mem")
+INIT_MEM = bytes(b for page in load_mem(INIT_MEM_FILE) for b in page)
+
+
+def ihex_record(rtype, addr, data):
+    rec = bytes([len(data)]) + struct.pack(">HB", addr, rtype) + data
+    return ":" + (rec + bytes([-sum(rec) & 0xff])).hex().upper() + "\n"
+
+
+# Little-endian ELF32 with the given sections, as (name, type, flags,
+# address, data). loads maps section names to the load address of a
+# PT_LOAD segment holding just that section.
+def make_elf(sections, loads=None):
+    sections = [("", 0, 0, 0, b"")] + sections + [(".shstrtab", 3, 0, 0,
+                                                   None)]
+    names = b"\0".join(s[0].encode() for s in sections) + b"\0"
+    name_offs = []
+    off = 0
+    for s in sections:
+        name_offs.append(off)
+        off += len(s[0]) + 1
+
+    body = b""
+    headers = []
+    segments = []
+    for (n, (name, sh_type, flags, addr, data)) in zip(name_offs,
+                                                       sections):
+        data = names if data is None else data
+        offset = 52 + len(body)
+        body += data
+        headers.append(struct.pack("<IIIIIIIIII", n, sh_type, flags, addr,
+                                   offset, len(data), 0, 0, 1, 0))
+        if loads and name in loads:
+            segments.append(struct.pack("<IIIIIIII", 1, offset, addr,
+                                        loads[name], len(data), len(data),
+                                        flags, 1))
+
+    shoff = 52 + len(body)
+    phoff = shoff + 40 * len(sections) if segments else 0
+    ehdr = b"\x7fELF\x01\x01\x01" + bytes(9) + struct.pack(
+        "<HHIIIIIHHHHHH", 2, 0xf3, 1, 0, phoff, shoff, 0, 52, 32,
+        len(segments), 40, len(sections), len(sections) - 1)
+    return ehdr + body + b"".join(headers) + b"".join(segments)
+
+
+def test_bin(tmp_path):
+    (tmp_path / "init.bin").write_bytes(INIT_MEM)
+    cfg = convert(tmp_path / "init.bin", tmp_path / "init.mem",
+                  dev_density="7000L")
+
+    # Same as the demo's ufm_config in ufm_reader.core.
+    assert cfg["start_page"] == 2042
+    assert cfg["num_pages"] == 4
+    assert (tmp_path / "init.mem").read_text() == \
+        open(INIT_MEM_FILE).read()
+
+
+def test_bin_partial_page(tmp_path):
+    (tmp_path / "short.bin").write_bytes(b"\x01" * 17)
+    cfg = convert(tmp_path / "short.bin", tmp_path / "short.mem",
+                  dev_density="1200L", fill=0xff)
+
+    assert cfg == {"init_mem": str(tmp_path / "short.mem"),
+                   "start_page": 509, "num_pages": 2, "zero_mem": False}
+    assert load_mem(tmp_path / "short.mem") == [[1] * 16,
+                                                [1] + [0xff] * 15]
+
+
+def test_too_big(tmp_path):
+    (tmp_path / "big.bin").write_bytes(bytes(191 * 16 + 1))
+    (tmp_path / "big.hex").write_text(
+        ihex_record(0, 0, b"\0") + ihex_record(0, 191 * 16, b"\0") +
+        ihex_record(1, 0, b""))
+
+    with pytest.raises(ValueError, match="larger than 191 pages"):
+        convert(tmp_path / "big.bin", tmp_path / "big.mem",
+                dev_density="640L")
+    with pytest.raises(ValueError, match="larger than 191 pages"):
+        convert(tmp_path / "big.hex", tmp_path / "big.mem",
+                dev_density="640L")
+    assert list(tmp_path.glob("*.mem*")) == []
+
+
+def test_ihex(tmp_path):
+    hex_file = tmp_path / "fw.hex"
+    hex_file.write_text(
+        ihex_record(4, 0, b"\x00\x01") +
+        ihex_record(0, 0x0004, b"abcd") +
+        # Leaves a gap.
+        ihex_record(0, 0x0020, b"efgh") +
+        ihex_record(5, 0, b"\x00\x01\x00\x04") +
+        ihex_record(1, 0, b""))
+
+    with open(hex_file) as fp:
+        assert list(read_ihex(fp)) == [(0x10004, b"abcd"),
+                                       (0x10020, b"efgh")]
+
+    cfg = convert(hex_file, tmp_path / "fw.mem", dev_density="7000L")
+    assert cfg["num_pages"] == 2
+    assert load_mem(tmp_path / "fw.mem") == [
+        list(b"abcd") + [0] * 12,
+        [0] * 12 + list(b"efgh")
+    ]
+
+
+def test_ihex_bad_checksum(tmp_path):
+    (tmp_path / "bad.hex").write_text(ihex_record(0, 0, b"ab")[:-3] + "00\n")
+    with pytest.raises(ValueError, match="checksum"):
+        convert(tmp_path / "bad.hex", tmp_path / "bad.mem",
+                dev_density="7000L")
+
+
+def test_elf(tmp_path):
+    elf = tmp_path / "fw.elf"
+    elf.write_bytes(make_elf([
+        (".text", 1, 6, 0x100, b"T" * 20),
+        (".rodata", 1, 2, 0x120, b"R" * 5),
+        (".bss", 8, 3, 0x200, b""),
+        (".comment", 1, 0, 0, b"not loaded"),
+    ]))
+
+    with open(elf, "rb") as fp:
+        assert list(read_elf(fp)) == [(0x100, b"T" * 20),
+                                      (0x120, b"R" * 5)]
+
+    convert(elf, tmp_path / "all.mem", dev_density="7000L")
+    assert load_mem(tmp_path / "all.mem") == [
+        [ord("T")] * 16,
+        [ord("T")] * 4 + [0] * 12,
+        [ord("R")] * 5 + [0] * 11
+    ]
+
+    cfg = convert(elf, tmp_path / "rodata.mem", dev_density="7000L",
+                  section=".rodata")
+    assert cfg["num_pages"] == 1
+
+    with pytest.raises(ValueError, match="no section"):
+        convert(elf, tmp_path / "x.mem", dev_density="7000L",
+                section=".data")
+
+
+# .data runs from RAM at 0x8000, but is loaded (and so stored in the UFM)
+# right after .text, like objcopy -O binary places it.
+def test_elf_load_addr(tmp_path):
+    elf = make_elf([
+        (".text", 1, 6, 0x100, b"T" * 20),
+        (".data", 1, 3, 0x8000, b"D" * 4),
+    ], loads={".text": 0x100, ".data": 0x114})
+
+    assert list(read_elf(io.BytesIO(elf))) == [(0x100, b"T" * 20),
+                                               (0x114, b"D" * 4)]
+    assert list(read_elf(io.BytesIO(elf), section=".data")) == \
+        [(0x114, b"D" * 4)]
+
+
+def test_overlap():
+    with pytest.raises(ValueError, match="overlaps"):
+        write_mem([(0, b"abcd"), (2, b"ef")], None)
+
+
+def test_compress(tmp_path):
+    image = b"\0" * 100 + b"Hello" * 20 + b"\xff" * 50
+    (tmp_path / "fw.bin").write_bytes(image)
+    cfg = convert(tmp_path / "fw.bin", tmp_path / "fw.mem",
+                  dev_density="7000L", compress_image=True)
+
+    data = bytes(b for page in load_mem(tmp_path / "fw.mem") for b in page)
+    index = load_index(tmp_path / "fw.mem.idx")
+    assert len(index) == 16
+    assert cfg["num_pages"] < 16
+    padded = image + bytes(-len(image) % 16)
+    assert b"".join(rle_decode(data[o:o + n])[0] for o, n in index) == \
+        padded
+
+
+def test_uniform_runs():
+    pages = [[0] * 16, [0] * 16, [0xff] * 16, list(range(16)), [0xff] * 16,
+             [0xff] * 16, [0xff] * 16, [0] * 15 + [1]]
+
+    assert uniform_runs(pages, 100) == \
+        [(100, 101, 0), (102, 102, 0xff), (104, 106, 0xff)]
+    assert uniform_runs(pages, min_pages=2) == [(0, 1, 0), (4, 6, 0xff)]
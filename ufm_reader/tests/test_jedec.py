@@ -0,0 +1,144 @@
+import os
+import random
+import time
+
+import pytest
+
+from ufm_reader.jedec import Jedec, patch
+from ufm_reader.sim import load_mem
+
+
+INIT_MEM = os.path.join(os.path.dirname(__file__), "..", "data", "init.mem")
+
+
+# A JEDEC file laid out like Diamond's: config rows from fuse 0, then the
+# UFM, one row per page.
+def make_jed(config_rows, ufm_rows, *, nl="\n", default=0, xmit=True):
+    ufm_addr = len(config_rows) * 128 + 256
+    num_fuses = ufm_addr + len(ufm_rows) * 128 + 5
+    fields = [
+        f"{nl}NOTE Test file",
+        f"{nl}QF{num_fuses}",
+        f"{nl}G0",
+        f"{nl}F{default}",
+        nl.join([f"{nl}L000000", *config_rows]) + nl,
+        f"{nl}NOTE END CONFIG DATA",
+        f"{nl}NOTE TAG DATA",
+        nl.join([f"{nl}L{ufm_addr:07d}", *ufm_rows]) + nl,
+        f"{nl}C0000",
+        f"{nl}NOTE END",
+        nl,
+    ]
+    body = "\x02" + "*".join(fields) + "\x03"
+    return body + (f"{sum(body.encode()) & 0xffff:04X}" if xmit else "0000")
+
+
+def random_rows(rng, n):
+    return [f"{rng.getrandbits(128):0128b}" for _ in range(n)]
+
+
+# Fuse checksum straight from the JEDEC standard, one fuse at a time.
+def naive_checksum(jed):
+    fuses = [jed.default] * jed.num_fuses
+    for i, field in enumerate(jed.fields):
+        if field.strip().startswith("L"):
+            (addr, rows) = jed.l_field(i)
+            for n, b in enumerate("".join(rows)):
+                fuses[addr + n] = int(b)
+
+    return sum(sum(fuses[i + j] << j for j in range(8) if i + j < len(fuses))
+               for i in range(0, len(fuses), 8)) & 0xffff
+
+
+def ufm_pages(jed):
+    return [list(int(r, 2).to_bytes(16, "big")) for r in jed.ufm_rows()]
+
+
+@pytest.mark.parametrize("nl", ["\n", "\r\n"])
+@pytest.mark.parametrize("default", [0, 1])
+def test_patch(tmp_path, nl, default):
+    rng = random.Random(0)
+    orig = make_jed(random_rows(rng, 20), random_rows(rng, 191), nl=nl,
+                    default=default)
+    (tmp_path / "old.jed").write_bytes(orig.encode())
+
+    (start, num) = patch(tmp_path / "old.jed", INIT_MEM,
+                         tmp_path / "new.jed", dev_density="640L")
+    assert (start, num) == (187, 4)
+
+    old = Jedec(orig)
+    new = Jedec.load(tmp_path / "new.jed")
+    assert ufm_pages(new) == ufm_pages(old)[:187] + load_mem(INIT_MEM)
+    assert new.fields[:7] == old.fields[:7]
+    assert new.fields[8] != old.fields[8]
+
+    text = (tmp_path / "new.jed").read_bytes().decode()
+    assert f"C{naive_checksum(new):04X}" in text
+    body = text[:text.index("\x03") + 1]
+    assert text[len(body):len(body) + 4] == \
+        f"{sum(body.encode()) & 0xffff:04X}"
+
+    # Putting the old pages back gives back the original file, apart from
+    # its checksum.
+    new.patch_ufm(187, ufm_pages(old)[187:])
+    assert new.dumps() == Jedec(orig).dumps()
+
+
+def test_no_xmit_checksum(tmp_path):
+    rng = random.Random(1)
+    (tmp_path / "old.jed").write_text(
+        make_jed(random_rows(rng, 2), random_rows(rng, 191), xmit=False))
+
+    patch(tmp_path / "old.jed", INIT_MEM, tmp_path / "new.jed",
+          dev_density="640L", start_page=0)
+    assert (tmp_path / "new.jed").read_text().endswith("\x030000")
+
+
+def test_wrong_device(tmp_path):
+    rng = random.Random(2)
+    (tmp_path / "old.jed").write_text(
+        make_jed(random_rows(rng, 2), random_rows(rng, 191)))
+
+    with pytest.raises(ValueError, match="has 191 UFM pages"):
+        patch(tmp_path / "old.jed", INIT_MEM, tmp_path / "new.jed",
+              dev_density="1200L")
+    with pytest.raises(ValueError, match="past the end"):
+        patch(tmp_path / "old.jed", INIT_MEM, tmp_path / "new.jed",
+              dev_density="640L", start_page=188)
+    assert not (tmp_path / "new.jed").exists()
+
+
+def test_image_too_big(tmp_path):
+    rng = random.Random(4)
+    (tmp_path / "old.jed").write_text(
+        make_jed(random_rows(rng, 2), random_rows(rng, 191)))
+    (tmp_path / "big.mem").write_text(("00" * 16 + "\n") * 192)
+
+    # Would otherwise start at page -1 and wrap around.
+    with pytest.raises(ValueError, match="192 pages"):
+        patch(tmp_path / "old.jed", tmp_path / "big.mem",
+              tmp_path / "new.jed", dev_density="640L")
+    with pytest.raises(ValueError, match="negative"):
+        patch(tmp_path / "old.jed", INIT_MEM, tmp_path / "new.jed",
+              dev_density="640L", start_page=-1)
+    assert not (tmp_path / "new.jed").exists()
+
+    jed = Jedec.load(tmp_path / "old.jed")
+    with pytest.raises(ValueError, match="don't fit"):
+        jed.patch_ufm(0, [[0] * 16] * 192)
+
+
+# A file the size of a 7000L's (about 2.2M fuses) has to be patched in well
+# under a second. Measured at about 0.04s.
+def test_patch_time(tmp_path):
+    rng = random.Random(3)
+    (tmp_path / "old.jed").write_text(
+        make_jed(random_rows(rng, 15000), random_rows(rng, 2046)))
+
+    start = time.perf_counter()
+    patch(tmp_path / "old.jed", INIT_MEM, tmp_path / "new.jed",
+          dev_density="7000L")
+    elapsed = time.perf_counter() - start
+
+    print(f"patched in {elapsed:.3f}s")
+    assert elapsed < 0.5
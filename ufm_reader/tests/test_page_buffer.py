@@ -0,0 +1,177 @@
+import pytest
+from amaranth.sim import Passive
+
+from ufm_reader.page_buffer import PageBuffer, Prefetch
+
+
+def page_byte(page, i):
+    return (page * 7 + i) & 0xff
+
+
+# Stand-in for the Streamer: after a page request, wait latency cycles,
+# then return one byte per strobe.
+def seq_proc(pb, log, latency=8):
+    def proc():
+        yield Passive()
+
+        while True:
+            if (yield pb.seq.stb):
+                page = yield pb.seq.addr
+                log.append(page)
+                for _ in range(latency):
+                    yield
+
+                for i in range(16):
+                    if i > 0:
+                        while not (yield pb.seq.stb):
+                            yield
+                    yield pb.seq.data.eq(page_byte(page, i))
+                    yield pb.seq.ack.eq(1)
+                    yield
+                    yield pb.seq.ack.eq(0)
+            else:
+                yield
+
+    return proc
+
+
+# Read each address in turn, holding read_en until valid and idling for
+# think cycles in between. Records the data and the number of cycles each
+# read took.
+def read_proc(pb, addrs, result, think=2):
+    def proc():
+        for addr in addrs:
+            yield pb.rand.addr.eq(addr)
+            yield pb.rand.read_en.eq(1)
+            yield
+
+            cycles = 1
+            while not (yield pb.rand.valid):
+                yield
+                cycles += 1
+            result.append(((yield pb.rand.data), cycles))
+            yield pb.rand.read_en.eq(0)
+
+            for _ in range(think):
+                yield
+
+    return proc
+
+
+def run_reads(sim, pb, addrs, think=2):
+    log = []
+    result = []
+    sim.run(sync_processes=[read_proc(pb, addrs, result, think),
+                            seq_proc(pb, log)])
+
+    assert [d for (d, _) in result] == \
+        [page_byte(a >> 4, a & 0xf) for a in addrs]
+    return [c for (_, c) in result], log
+
+
+@pytest.mark.module(PageBuffer())
+@pytest.mark.clks((1.0 / 12e6,))
+def test_no_prefetch(sim_mod):
+    sim, pb = sim_mod
+    cycles, log = run_reads(sim, pb, range(64))
+
+    assert log == [0, 1, 2, 3]
+    # Each page boundary stalls until the first byte has landed.
+    assert all(cycles[i] > min(cycles) for i in range(0, 64, 16))
+
+
+@pytest.mark.module(PageBuffer(prefetch=Prefetch.NEXT_PAGE))
+@pytest.mark.clks((1.0 / 12e6,))
+def test_prefetch_next(sim_mod):
+    sim, pb = sim_mod
+    cycles, log = run_reads(sim, pb, range(64))
+
+    assert log[:4] == [0, 1, 2, 3]
+    # Only the very first page has to wait.
+    assert max(cycles[16:]) == min(cycles)
+
+
+@pytest.mark.module(PageBuffer(prefetch="stride"))
+@pytest.mark.clks((1.0 / 12e6,))
+def test_prefetch_stride(sim_mod):
+    sim, pb = sim_mod
+    addrs = [a for page in range(0, 15, 3) for a in range(16*page,
+                                                          16*page + 16)]
+    cycles, log = run_reads(sim, pb, addrs)
+
+    assert log[:5] == [0, 3, 6, 9, 12]
+    # Stride is known after the second page.
+    assert max(cycles[32:]) == min(cycles)
+
+
+@pytest.mark.module(PageBuffer())
+@pytest.mark.clks((1.0 / 12e6,))
+def test_two_banks(sim_mod):
+    sim, pb = sim_mod
+    # Ping-pong between two pages; both should stay resident.
+    addrs = [0, 32, 1, 33, 2, 34]
+    cycles, log = run_reads(sim, pb, addrs)
+
+    assert log == [0, 2]
+    assert max(cycles[2:]) == min(cycles)
+
+
+@pytest.mark.module(PageBuffer())
+@pytest.mark.clks((1.0 / 12e6,))
+def test_early_restart(sim_mod):
+    sim, pb = sim_mod
+    # Byte k of page k, so that every read misses. Leave enough time
+    # between reads for the rest of the page to arrive.
+    addrs = [16*k + k for k in range(16)]
+    cycles, log = run_reads(sim, pb, addrs, think=32)
+
+    assert log == list(range(16))
+    # Each read waits only until its own byte has arrived...
+    assert cycles == sorted(cycles)
+    assert cycles[0] < cycles[15] - 14
+    # ...which for uniformly distributed offsets is well under the time to
+    # fill the whole page.
+    assert sum(cycles) / 16 < 0.75 * cycles[15]
+
+
+@pytest.mark.module(PageBuffer(width=32))
+@pytest.mark.clks((1.0 / 12e6,))
+def test_width_32(sim_mod):
+    sim, pb = sim_mod
+    log = []
+    result = []
+    # Low address bits are ignored.
+    addrs = [0, 4, 9, 12, 16, 63]
+    sim.run(sync_processes=[read_proc(pb, addrs, result),
+                            seq_proc(pb, log)])
+
+    words = []
+    for a in addrs:
+        a &= ~3
+        words.append(sum(page_byte(a >> 4, (a & 0xf) + i) << (8 * i)
+                         for i in range(4)))
+    assert [d for (d, _) in result] == words
+    assert log == [0, 1, 3]
+    # Once resident, a whole word takes a single access.
+    assert [c for (_, c) in result][1:4] == [min(c for (_, c) in result)] * 3
+
+
+# Pages 1 and 2 are taken to be all 0xa5, without asking the Streamer.
+@pytest.mark.module(PageBuffer(prefetch=Prefetch.NEXT_PAGE,
+                               uniform=[(1, 2, 0xa5)]))
+@pytest.mark.clks((1.0 / 12e6,))
+def test_uniform(sim_mod):
+    sim, pb = sim_mod
+    log = []
+    result = []
+    sim.run(sync_processes=[read_proc(pb, range(64), result),
+                            seq_proc(pb, log)])
+
+    assert [d for (d, _) in result] == \
+        [0xa5 if 16 <= a < 48 else page_byte(a >> 4, a & 0xf)
+         for a in range(64)]
+    # Page 3 is prefetched while pages 1 and 2 are read (and page 4 while
+    # page 3 is).
+    assert log == [0, 3, 4]
+    cycles = [c for (_, c) in result]
+    assert cycles[16:] == [min(cycles)] * 48
@@ -0,0 +1,71 @@
+import pytest
+
+from ufm_reader.perf import Counter
+from ufm_reader.reader import Reader
+
+from test_streamer import efb_model
+
+
+def read_counters(rdr):
+    counters = {}
+    for c in Counter:
+        yield rdr.perf.addr.eq(c)
+        yield
+        yield
+        counters[c] = yield rdr.perf.data
+
+    return counters
+
+
+@pytest.mark.module(Reader(session_timeout=16, perf=True))
+@pytest.mark.clks((1.0 / 12e6,))
+def test_reader_counters(sim_mod):
+    sim, rdr = sim_mod
+    efb = efb_model(rdr.efb)
+    # Still busy from before reset, so the first status poll has to retry.
+    efb.busy = 200
+    result = []
+
+    def proc():
+        cycles = 0
+        for addr in range(64):
+            yield rdr.bus.addr.eq(addr)
+            yield rdr.bus.read_en.eq(1)
+            yield
+            cycles += 1
+            while not (yield rdr.bus.valid):
+                yield
+                cycles += 1
+            assert (yield rdr.bus.data) == addr
+            # Held for an extra cycle; still only one byte.
+            yield
+            cycles += 1
+            yield rdr.bus.read_en.eq(0)
+            yield
+            cycles += 1
+
+        counters = yield from read_counters(rdr)
+        result.append((counters, cycles))
+
+        yield rdr.perf.clear.eq(1)
+        yield
+        yield rdr.perf.clear.eq(0)
+        result.append((yield from read_counters(rdr)))
+
+    sim.run(sync_processes=[proc, efb.process])
+
+    (counters, cycles), cleared = result
+
+    assert counters[Counter.PAGE_MISSES] == 4
+    assert counters[Counter.BYTES] == 64
+    assert counters[Counter.POLL_RETRIES] > 0
+    assert counters[Counter.BUSY_CYCLES] > 100
+    assert counters[Counter.DATA_CYCLES] > 4 * 16
+    assert counters[Counter.WB_WAIT_CYCLES] > 0
+    # Every cycle is in exactly one phase. The phase counters are read one
+    # after the other, 2 cycles apart, so allow for the extra cycles.
+    phases = [Counter.IDLE_CYCLES, Counter.SETUP_CYCLES, Counter.DATA_CYCLES,
+              Counter.BUSY_CYCLES]
+    assert cycles <= sum(counters[c] for c in phases) <= cycles + 2 * 8
+    # Only what happened while reading the counters back.
+    assert all(v <= 2 * 8 for v in cleared.values())
@@ -0,0 +1,90 @@
+import random
+
+import pytest
+
+from ufm_reader.reader import Reader
+
+from test_streamer import efb_model
+
+
+# Issue a streamed read, then drain src, only accepting a byte when the
+# (seeded) dice say so.
+def stream_proc(rdr, addr, length, result, accept=1.0):
+    def proc():
+        rng = random.Random(0)
+
+        yield rdr.cmd.addr.eq(addr)
+        yield rdr.cmd.len.eq(length)
+        yield rdr.cmd.valid.eq(1)
+        yield
+        while not (yield rdr.cmd.ready):
+            yield
+        yield rdr.cmd.valid.eq(0)
+
+        cycles = 0
+        while len(result) < length:
+            ready = rng.random() < accept
+            yield rdr.src.ready.eq(ready)
+            yield
+            cycles += 1
+            if ready and (yield rdr.src.valid):
+                result.append((yield rdr.src.data))
+        yield rdr.src.ready.eq(0)
+
+        result.append(cycles)
+
+    return proc
+
+
+@pytest.mark.module(Reader(stream=True))
+@pytest.mark.clks((1.0 / 12e6,))
+def test_stream(sim_mod):
+    sim, rdr = sim_mod
+    result = []
+    sim.run(sync_processes=[stream_proc(rdr, 5, 40, result),
+                            efb_model(rdr.efb).process])
+
+    assert result[:-1] == [(5 + i) & 0xff for i in range(40)]
+
+
+@pytest.mark.module(Reader(stream=True, session_timeout=16))
+@pytest.mark.clks((1.0 / 12e6,))
+def test_stream_backpressure(sim_mod):
+    sim, rdr = sim_mod
+    result = []
+    sim.run(sync_processes=[stream_proc(rdr, 0x7f0, 100, result,
+                                        accept=0.1),
+                            efb_model(rdr.efb).process])
+
+    assert result[:-1] == [(0x7f0 + i) & 0xff for i in range(100)]
+
+
+@pytest.mark.module(Reader(stream=True))
+@pytest.mark.clks((1.0 / 12e6,))
+def test_stream_and_random(sim_mod):
+    sim, rdr = sim_mod
+    streamed = []
+    random_reads = []
+
+    def rand_proc():
+        for addr in (100, 200, 300):
+            yield rdr.bus.addr.eq(addr)
+            yield rdr.bus.read_en.eq(1)
+            yield
+            while not (yield rdr.bus.valid):
+                yield
+            random_reads.append((yield rdr.bus.data))
+            yield rdr.bus.read_en.eq(0)
+            yield
+
+    sim.run(sync_processes=[stream_proc(rdr, 1000, 64, streamed,
+                                        accept=0.5),
+                            rand_proc, efb_model(rdr.efb).process])
+
+    assert streamed[:-1] == [(1000 + i) & 0xff for i in range(64)]
+    assert random_reads == [100, 200, 300 & 0xff]
+
+
+def test_cache_width():
+    with pytest.raises(ValueError, match="Reader's width"):
+        Reader(cache={"lines": 8, "width": 32}, width=32)
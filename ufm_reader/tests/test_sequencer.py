@@ -1,8 +1,8 @@
 import pytest
-from amaranth.sim import Passive
+from amaranth.sim import Passive, Simulator
 
-from ufm_reader.sequencer import Sequencer, Name, ConstantOp
-from gen.sequencer import Wrapper
+from ufm_reader.sequencer import Sequencer, Wrapper, Name, ConstantOp
+from ufm_reader.sim import EfbModel
 
 
 @pytest.mark.module(Wrapper(Sequencer()))
@@ -88,3 +88,55 @@ def test_wrapper_write(sim_mod):
             yield
 
     sim.run(sync_processes=[in_proc, ack_proc])
+
+
+# Run a READ_UFM of data_len bytes, returning the number of cycles from req
+# until done, along with the bytes strobed out on rd.
+def read_ufm_cycles(seq, result):
+    def proc():
+        yield seq.ctl.req.eq(1)
+        yield seq.ctl.cmd.cmd.eq(Name.READ_UFM)
+        yield seq.ctl.cmd.ops.read_ufm.pages.eq(1)
+        yield seq.ctl.cmd.ops.read_ufm.port.eq(1)
+        yield seq.ctl.op_len.eq(3)
+        yield seq.ctl.data_len.eq(16)
+        yield seq.ctl.xfer_is_wr.eq(0)
+        yield
+        yield seq.ctl.req.eq(0)
+
+        cycles = 1
+        data = []
+        while not (yield seq.ctl.done):
+            if (yield seq.rd.stb):
+                data.append((yield seq.rd.data))
+            yield
+            cycles += 1
+
+        result.append(cycles)
+        result.append(data)
+
+    return proc
+
+
+@pytest.mark.parametrize("pipelined", [False, True])
+def test_pipelined_cycles(pipelined):
+    seq = Wrapper(Sequencer(pipelined=pipelined))
+    sim = Simulator(seq)
+    sim.add_clock(1.0 / 12e6)
+
+    result = []
+    sim.add_sync_process(read_ufm_cycles(seq, result))
+    sim.add_sync_process(EfbModel(seq.efb, fill=lambda addr: addr).process)
+    sim.run()
+
+    cycles, data = result
+    assert data == list(range(16))
+
+    # 1 enable, 1 command, 3 operands, 16 data bytes, 1 disable. Each
+    # byte takes 2 cycles until ack (including the idle cycle the EFB
+    # model inserts between acks). The non-pipelined FSM spends
+    # another cycle per byte in its *_2 state.
+    if pipelined:
+        assert cycles == 22 * 2 + 2
+    else:
+        assert cycles == 22 * 3 + 1
@@ -0,0 +1,67 @@
+import pytest
+from amaranth.sim import Simulator
+
+from ufm_reader.efb import UFM_END_PAGE
+from ufm_reader.sequencer import Name
+from ufm_reader.shadow import Shadow, max_shadow_pages
+
+from test_streamer import efb_model
+
+
+# Read each address in turn the way test_page_buffer.read_proc does,
+# starting straight after reset. Returns the data read and the cycles each
+# read took.
+def shadow_proc(shadow, addrs, result):
+    def proc():
+        for addr in addrs:
+            yield shadow.rand.addr.eq(addr)
+            yield shadow.rand.read_en.eq(1)
+            yield
+            cycles = 1
+            while not (yield shadow.rand.valid):
+                yield
+                cycles += 1
+            assert (yield shadow.ready)
+            result.append(((yield shadow.rand.data), cycles))
+            yield shadow.rand.read_en.eq(0)
+            yield
+
+    return proc
+
+
+@pytest.mark.parametrize("width", [8, 32])
+def test_shadow(width):
+    shadow = Shadow(start_page=100, num_pages=4, width=width)
+    sim = Simulator(shadow)
+    sim.add_clock(1.0 / 12e6)
+    efb = efb_model(shadow.efb)
+
+    addrs = [1600 + i for i in range(0, 64, width // 8)][::-1]
+    result = []
+    sim.add_sync_process(shadow_proc(shadow, addrs, result))
+    sim.add_sync_process(efb.process)
+    sim.run()
+
+    assert efb.log.count(Name.READ_UFM) == 1
+    # Byte at the lowest address in the low bits.
+    assert [d for (d, _) in result] == \
+        [sum(((a + i) & 0xff) << (8 * i) for i in range(width // 8))
+         for a in addrs]
+    # The first read waits for the copy; the rest take as long as a page
+    # buffer hit.
+    cycles = [c for (_, c) in result]
+    assert cycles[0] > 64
+    assert cycles[1:] == [2] * (len(addrs) - 1)
+
+
+def test_max_shadow_pages():
+    # There's less EBR than UFM on every device.
+    for dev_density in UFM_END_PAGE:
+        assert max_shadow_pages(dev_density) < UFM_END_PAGE[dev_density]
+    assert max_shadow_pages("7000L") == 26 * 64
+    assert max_shadow_pages("1200L") == 7 * 64
+
+
+def test_shadow_too_big():
+    with pytest.raises(ValueError, match="past the end"):
+        Shadow(start_page=2000, num_pages=100)
@@ -0,0 +1,58 @@
+import os
+
+import pytest
+from amaranth.sim import Simulator
+
+from ufm_reader.reader import Reader
+from ufm_reader.sim import EfbModel, load_mem
+from ufm_reader.streamer import Streamer
+
+from test_streamer import read_pages
+
+
+INIT_MEM = os.path.join(os.path.dirname(__file__), "..", "data", "init.mem")
+
+
+@pytest.mark.module(Reader(session_timeout=16))
+@pytest.mark.clks((1.0 / 12e6,))
+def test_reader_init_mem(sim_mod):
+    sim, rdr = sim_mod
+    efb = EfbModel(rdr.efb, init_mem=INIT_MEM, start_page=2042)
+    data = []
+
+    def proc():
+        for addr in range(2042 * 16, 2046 * 16):
+            yield rdr.bus.addr.eq(addr)
+            yield rdr.bus.read_en.eq(1)
+            yield
+            while not (yield rdr.bus.valid):
+                yield
+            data.append((yield rdr.bus.data))
+            yield rdr.bus.read_en.eq(0)
+            yield
+
+    sim.run(sync_processes=[proc, efb.process])
+
+    assert bytes(data) == b"".join(bytes(p) for p in load_mem(INIT_MEM))
+    assert bytes(data).startswith(b"The quick brown fox")
+
+
+def test_ack_latency():
+    def cycles_per_byte(ack_latency):
+        streamer = Streamer(pages=4)
+        sim = Simulator(streamer)
+        sim.add_clock(1.0 / 12e6)
+        result = []
+        sim.add_sync_process(read_pages(streamer, 4, result, pages=4))
+        sim.add_sync_process(EfbModel(streamer.efb, fill=lambda addr: addr,
+                                      ack_latency=ack_latency).process)
+        sim.run()
+
+        assert result[:-1] == list(range(64))
+        return result[-1] / 64
+
+    latencies = [1, 2, 4]
+    cycles = [cycles_per_byte(lat) for lat in latencies]
+    print("cycles/byte: " + ", ".join(f"ack latency {lat} {c:.2f}"
+                                      for lat, c in zip(latencies, cycles)))
+    assert cycles[0] < cycles[1] < cycles[2]
@@ -0,0 +1,382 @@
+import pytest
+from amaranth.sim import Passive, Simulator
+
+from ufm_reader.sequencer import Name
+from ufm_reader.sim import EfbModel
+from ufm_reader.streamer import Streamer, Op, BusyWait
+
+
+# Every UFM byte holds the low byte of its address, so reads can be
+# checked without knowing which page they came from.
+def efb_model(efb, **kwargs):
+    return EfbModel(efb, fill=lambda addr: addr & 0xff, **kwargs)
+
+
+# Read num_pages pages from start on back-to-back the way the PageBuffer
+# does, pages at a time; returns the number of clocks taken from the first
+# request to the last byte. If latencies is a list, the clocks from each
+# request to its first byte are appended to it.
+def read_pages(streamer, num_pages, result, pages=0, start=0,
+               latencies=None):
+    def proc():
+        cycles = 0
+        per_req = 16 * max(pages, 1)
+        for page in range(start, start + num_pages, max(pages, 1)):
+            yield streamer.stream.addr.eq(page)
+            yield streamer.stream.pages.eq(pages)
+            yield streamer.stream.stb.eq(1)
+            yield
+            yield streamer.stream.stb.eq(0)
+            cycles += 1
+
+            req_start = cycles
+            received = 0
+            while received < per_req:
+                if (yield streamer.stream.ack):
+                    if received == 0 and latencies is not None:
+                        latencies.append(cycles - req_start + 1)
+                    result.append((yield streamer.stream.data))
+                    received += 1
+                    if received < per_req:
+                        yield streamer.stream.stb.eq(1)
+                else:
+                    yield streamer.stream.stb.eq(0)
+                yield
+                cycles += 1
+            yield streamer.stream.stb.eq(0)
+
+        result.append(cycles)
+
+    return proc
+
+
+# Returns the data read, the cycles taken and the EFB command log.
+def run_pages(sim, streamer, num_pages):
+    result = []
+    efb = efb_model(streamer.efb)
+    sim.run(sync_processes=[read_pages(streamer, num_pages, result),
+                            efb.process])
+    return result[:-1], result[-1], efb.log
+
+
+@pytest.mark.module(Streamer())
+@pytest.mark.clks((1.0 / 12e6,))
+def test_streamer_oneshot(sim_mod):
+    sim, streamer = sim_mod
+    data, _, log = run_pages(sim, streamer, 4)
+
+    assert data == list(range(64))
+    assert log.count(Name.ENABLE_CONFIG) == 4
+
+
+def test_streamer_poll_status():
+    def polls_and_cycles(streamer):
+        sim = Simulator(streamer)
+        sim.add_clock(1.0 / 12e6)
+        efb = efb_model(streamer.efb)
+        result = []
+        sim.add_sync_process(read_pages(streamer, 8, result))
+        sim.add_sync_process(efb.process)
+        sim.run()
+
+        assert result[:-1] == list(range(128))
+        return efb.log.count(Name.POLL_STATUS), result[-1]
+
+    always, always_time = polls_and_cycles(Streamer(poll_status=True))
+    pending, pending_time = polls_and_cycles(Streamer())
+
+    print(f"8 oneshot reads: POLL_STATUS {always} -> {pending}, "
+          f"cycles {always_time} -> {pending_time}")
+    assert always == 8
+    # Only the first session after reset polls.
+    assert pending == 1
+    assert pending_time < always_time
+
+
+@pytest.mark.module(Streamer(session_timeout=8))
+@pytest.mark.clks((1.0 / 12e6,))
+def test_streamer_session(sim_mod):
+    sim, streamer = sim_mod
+    data, _, log = run_pages(sim, streamer, 4)
+
+    assert data == list(range(64))
+    # The UFM address is only set once; it follows the reads after that.
+    assert log == [Name.ENABLE_CONFIG, Name.POLL_STATUS,
+                   Name.SET_UFM_ADDR] + [Name.READ_UFM] * 4
+
+
+def test_streamer_session_cycles_per_byte():
+    def cycles_per_byte(streamer):
+        sim = Simulator(streamer)
+        sim.add_clock(1.0 / 12e6)
+        result = []
+        sim.add_sync_process(read_pages(streamer, 8, result))
+        sim.add_sync_process(efb_model(streamer.efb).process)
+        sim.run()
+        return result[-1] / (8 * 16)
+
+    oneshot = cycles_per_byte(Streamer())
+    session = cycles_per_byte(Streamer(session_timeout=8))
+
+    print(f"cycles/byte: oneshot {oneshot:.2f}, session {session:.2f}")
+    assert session < oneshot
+
+
+@pytest.mark.module(Streamer(session_timeout=4))
+@pytest.mark.clks((1.0 / 12e6,))
+def test_streamer_session_timeout(sim_mod):
+    sim, streamer = sim_mod
+    efb = efb_model(streamer.efb)
+
+    def proc():
+        yield from read_pages(streamer, 1, [])()
+        for _ in range(64):
+            yield
+
+    sim.run(sync_processes=[proc, efb.process])
+
+    assert efb.log == [Name.ENABLE_CONFIG, Name.POLL_STATUS,
+                       Name.SET_UFM_ADDR, Name.READ_UFM, Name.DISABLE_CONFIG,
+                       Name.BYPASS]
+
+
+@pytest.mark.module(Streamer(session_timeout=1000))
+@pytest.mark.clks((1.0 / 12e6,))
+def test_streamer_session_release(sim_mod):
+    sim, streamer = sim_mod
+    efb = efb_model(streamer.efb)
+
+    def proc():
+        yield from read_pages(streamer, 1, [])()
+        yield streamer.stream.release.eq(1)
+        yield
+        yield streamer.stream.release.eq(0)
+        for _ in range(32):
+            yield
+
+    sim.run(sync_processes=[proc, efb.process])
+
+    assert efb.log[-2:] == [Name.DISABLE_CONFIG, Name.BYPASS]
+
+
+@pytest.mark.module(Streamer(pages=128))
+@pytest.mark.clks((1.0 / 12e6,))
+def test_streamer_burst_2k(sim_mod):
+    sim, streamer = sim_mod
+    efb = efb_model(streamer.efb)
+
+    result = []
+    sim.run(sync_processes=[read_pages(streamer, 128, result, pages=128),
+                            efb.process])
+
+    assert result[:-1] == [i & 0xff for i in range(2048)]
+    assert efb.log.count(Name.READ_UFM) == 1
+
+
+@pytest.mark.module(Streamer(dummy_bytes=3))
+@pytest.mark.clks((1.0 / 12e6,))
+def test_streamer_burst_per_request(sim_mod):
+    sim, streamer = sim_mod
+    efb = efb_model(streamer.efb, dummy_bytes=3)
+
+    result = []
+    sim.run(sync_processes=[read_pages(streamer, 8, result, pages=4),
+                            efb.process])
+
+    assert result[:-1] == list(range(128))
+    assert efb.log.count(Name.READ_UFM) == 2
+
+
+@pytest.mark.module(Streamer(session_timeout=8, pipelined=True))
+@pytest.mark.clks((1.0 / 12e6,))
+def test_streamer_pipelined(sim_mod):
+    sim, streamer = sim_mod
+    data, _, log = run_pages(sim, streamer, 4)
+
+    assert data == list(range(64))
+    assert log == [Name.ENABLE_CONFIG, Name.POLL_STATUS,
+                   Name.SET_UFM_ADDR] + [Name.READ_UFM] * 4
+
+
+@pytest.mark.module(Streamer(session_timeout=8))
+@pytest.mark.clks((1.0 / 12e6,))
+def test_streamer_track_addr_jump(sim_mod):
+    sim, streamer = sim_mod
+    efb = efb_model(streamer.efb)
+    result = []
+
+    def proc():
+        yield from read_pages(streamer, 2, result, start=5)()
+        yield from read_pages(streamer, 2, result, start=2)()
+
+    sim.run(sync_processes=[proc, efb.process])
+
+    # Each read_pages appends its cycle count after the data.
+    assert result[:32] == list(range(5 * 16, 7 * 16))
+    assert result[33:65] == list(range(2 * 16, 4 * 16))
+    assert efb.log == [Name.ENABLE_CONFIG, Name.POLL_STATUS,
+                       Name.SET_UFM_ADDR, Name.READ_UFM, Name.READ_UFM,
+                       Name.SET_UFM_ADDR, Name.READ_UFM, Name.READ_UFM]
+
+
+def test_streamer_track_addr_scan():
+    def scan(streamer):
+        sim = Simulator(streamer)
+        sim.add_clock(1.0 / 12e6)
+        efb = efb_model(streamer.efb)
+        result = []
+        transactions = [0]
+
+        def count_proc():
+            yield Passive()
+            while True:
+                yield
+                if (yield streamer.efb.ack):
+                    transactions[0] += 1
+
+        sim.add_sync_process(read_pages(streamer, 64, result))
+        sim.add_sync_process(count_proc)
+        sim.add_sync_process(efb.process)
+        sim.run()
+
+        assert result[:-1] == [i & 0xff for i in range(64 * 16)]
+        return efb.log.count(Name.SET_UFM_ADDR), transactions[0], result[-1]
+
+    (set_addr, xfers, cycles) = scan(Streamer(session_timeout=64,
+                                              track_addr=False))
+    (set_addr_t, xfers_t, cycles_t) = scan(Streamer(session_timeout=64))
+
+    print(f"64 page scan: SET_UFM_ADDR {set_addr} -> {set_addr_t}, "
+          f"wishbone transactions {xfers} -> {xfers_t}, "
+          f"cycles {cycles} -> {cycles_t}")
+    assert set_addr == 64
+    assert set_addr_t == 1
+    # SET_UFM_ADDR is 4 command bytes and 4 address bytes, plus a write
+    # to CFGCR on each side to frame it.
+    assert xfers - xfers_t == 63 * 10
+    assert cycles_t < cycles
+
+
+@pytest.mark.module(Streamer(pipelined=True))
+@pytest.mark.clks((1.0 / 12e6,))
+def test_streamer_back_to_back(sim_mod):
+    sim, streamer = sim_mod
+    efb = efb_model(streamer.efb)
+    trace = []
+
+    def bus_proc():
+        yield Passive()
+        while True:
+            yield
+            trace.append(((yield streamer.efb.cyc), (yield streamer.efb.ack)))
+
+    sim.run(sync_processes=[read_pages(streamer, 1, []), bus_proc,
+                            efb.process])
+
+    assert efb.log == [Name.ENABLE_CONFIG, Name.POLL_STATUS,
+                       Name.SET_UFM_ADDR, Name.READ_UFM]
+    # Pipelined, the bus only goes idle for WB_DISABLE_2, which is also
+    # the cycle the next command is requested in.
+    first = next(i for i, (cyc, _) in enumerate(trace) if cyc)
+    last = max(i for i, (_, ack) in enumerate(trace) if ack)
+    assert [cyc for (cyc, _) in trace[first:last]].count(0) == 3
+
+
+# Erase, then program num_pages pages starting at start, feeding data one
+# byte at a time and dawdling every so often.
+def program_proc(streamer, start, num_pages, data):
+    def proc():
+        yield streamer.stream.op.eq(Op.ERASE)
+        yield streamer.stream.stb.eq(1)
+        yield
+        yield streamer.stream.stb.eq(0)
+        yield
+        while not (yield streamer.stream.ready):
+            yield
+
+        yield streamer.stream.op.eq(Op.PROGRAM)
+        yield streamer.stream.addr.eq(start)
+        yield streamer.stream.pages.eq(num_pages)
+        yield streamer.stream.stb.eq(1)
+        yield
+        yield streamer.stream.stb.eq(0)
+
+        for i, byte in enumerate(data):
+            if i % 5 == 0:
+                yield streamer.stream.wr_valid.eq(0)
+                yield
+            yield streamer.stream.wr_data.eq(byte)
+            yield streamer.stream.wr_valid.eq(1)
+            yield
+            while not (yield streamer.stream.wr_ready):
+                yield
+        yield streamer.stream.wr_valid.eq(0)
+
+        yield
+        while not (yield streamer.stream.ready):
+            yield
+
+    return proc
+
+
+@pytest.mark.parametrize("session_timeout,sessions", [(None, 2), (8, 1)])
+def test_streamer_program(session_timeout, sessions):
+    streamer = Streamer(session_timeout=session_timeout)
+    sim = Simulator(streamer)
+    sim.add_clock(1.0 / 12e6)
+
+    efb = efb_model(streamer.efb, busy_cycles=100)
+    efb.ufm[100] = [0xAA] * 16
+    data = [(i * 13) & 0xff for i in range(64)]
+    sim.add_sync_process(program_proc(streamer, 2040, 4, data))
+    sim.add_sync_process(efb.process)
+    sim.run()
+
+    log = efb.log
+    assert efb.ufm == {2040 + p: data[16*p:16*p + 16] for p in range(4)}
+    # One session for the whole region (shared with the erase, if the
+    # session is still open).
+    assert log.count(Name.ENABLE_CONFIG) == sessions
+    assert log.count(Name.PROGRAM_UFM) == 4
+    assert log.count(Name.SET_UFM_ADDR) == 1
+    # The erase was seen to finish, so a new session needn't poll.
+    assert log.count(Name.POLL_STATUS) == 1
+    # Polled until not busy after the erase and after each page; with
+    # busy_cycles=100, that's 5 checks each.
+    assert log.count(Name.CHECK_BUSY) == 5 * 5
+
+
+def test_streamer_busy_wait():
+    def polls_and_cycles(streamer):
+        sim = Simulator(streamer)
+        sim.add_clock(1.0 / 12e6)
+        efb = efb_model(streamer.efb, busy_cycles=1000)
+        data = list(range(64))
+        cycles = [0]
+
+        def count_proc():
+            yield Passive()
+            while True:
+                yield
+                cycles[0] += 1
+
+        sim.add_sync_process(program_proc(streamer, 0, 4, data))
+        sim.add_sync_process(count_proc)
+        sim.add_sync_process(efb.process)
+        sim.run()
+
+        assert efb.ufm == {p: data[16*p:16*p + 16] for p in range(4)}
+        return efb.log.count(Name.CHECK_BUSY), cycles[0]
+
+    poll, poll_time = polls_and_cycles(Streamer())
+    backoff, backoff_time = polls_and_cycles(
+        Streamer(busy_wait=BusyWait.BACKOFF, backoff=32, max_backoff=256))
+    irq, irq_time = polls_and_cycles(Streamer(busy_wait="irq"))
+
+    print(f"busy checks: poll {poll}, backoff {backoff}, irq {irq}")
+    print(f"cycles: poll {poll_time}, backoff {backoff_time}, "
+          f"irq {irq_time}")
+    # One check that finds it busy, one after the interrupt.
+    assert irq == 2 * 5
+    assert irq < backoff < poll
+    assert irq_time < 1.05 * poll_time
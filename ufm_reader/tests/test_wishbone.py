@@ -0,0 +1,122 @@
+import pytest
+from amaranth.sim import Simulator
+
+from ufm_reader.wishbone import WishboneReader, CTI_CLASSIC, CTI_INCR, \
+    CTI_END
+
+from test_streamer import efb_model
+
+
+def word_at(addr):
+    return sum(((addr + i) & 0xff) << (8 * i) for i in range(4))
+
+
+# Wishbone master. Each cycle is a list of word addresses; if burst is
+# set, they are read as one linear incrementing burst. Appends
+# (data, err) for each word, then the total number of clocks taken.
+def wb_proc(wb, cycles, result, burst=False, we=False):
+    def proc():
+        clocks = 0
+        for adrs in cycles:
+            yield wb.bus.cyc.eq(1)
+            yield wb.bus.stb.eq(1)
+            yield wb.bus.we.eq(we)
+            for i, adr in enumerate(adrs):
+                yield wb.bus.adr.eq(adr)
+                if not burst:
+                    yield wb.bus.cti.eq(CTI_CLASSIC)
+                elif i == len(adrs) - 1:
+                    yield wb.bus.cti.eq(CTI_END)
+                else:
+                    yield wb.bus.cti.eq(CTI_INCR)
+
+                yield
+                clocks += 1
+                while not ((yield wb.bus.ack) or (yield wb.bus.err)):
+                    yield
+                    clocks += 1
+                result.append(((yield wb.bus.dat_r), (yield wb.bus.err)))
+
+            yield wb.bus.cyc.eq(0)
+            yield wb.bus.stb.eq(0)
+            yield
+            clocks += 1
+
+        result.append(clocks)
+
+    return proc
+
+
+@pytest.mark.module(WishboneReader())
+@pytest.mark.clks((1.0 / 12e6,))
+def test_classic(sim_mod):
+    sim, wb = sim_mod
+    result = []
+    adrs = [0, 1, 2, 100, 3]
+    sim.run(sync_processes=[wb_proc(wb, [[a] for a in adrs], result),
+                            efb_model(wb.efb).process])
+
+    assert result[:-1] == [(word_at(4 * a), 0) for a in adrs]
+
+
+@pytest.mark.module(WishboneReader())
+@pytest.mark.clks((1.0 / 12e6,))
+def test_write_err(sim_mod):
+    sim, wb = sim_mod
+    result = []
+    sim.run(sync_processes=[wb_proc(wb, [[0]], result, we=True),
+                            efb_model(wb.efb).process])
+
+    assert result[0][1] == 1
+
+
+@pytest.mark.module(WishboneReader(burst_len=32))
+@pytest.mark.clks((1.0 / 12e6,))
+def test_burst(sim_mod):
+    sim, wb = sim_mod
+    result = []
+    # Longer than burst_len, then a burst ending partway through a
+    # streamed read, then a classic read of the next word after the drain.
+    cycles = [list(range(4, 4 + 20)), list(range(200, 203))]
+
+    def proc():
+        yield from wb_proc(wb, cycles, result, burst=True)()
+        yield from wb_proc(wb, [[203]], result)()
+
+    sim.run(sync_processes=[proc, efb_model(wb.efb).process])
+
+    burst_words = [(word_at(4 * a), 0) for c in cycles for a in c]
+    assert result[:len(burst_words)] == burst_words
+    assert result[len(burst_words) + 1] == (word_at(4 * 203), 0)
+
+
+def test_burst_bytes_per_cycle():
+    def bytes_per_cycle(wb, burst):
+        sim = Simulator(wb)
+        sim.add_clock(1.0 / 12e6)
+        result = []
+        words = 128
+        if burst:
+            cycles = [list(range(words))]
+        else:
+            cycles = [[a] for a in range(words)]
+        sim.add_sync_process(wb_proc(wb, cycles, result, burst=burst))
+        sim.add_sync_process(efb_model(wb.efb).process)
+        sim.run()
+
+        assert result[:-1] == [(word_at(4 * a), 0) for a in range(words)]
+        return 4 * words / result[-1]
+
+    single = bytes_per_cycle(WishboneReader(), False)
+    burst = bytes_per_cycle(WishboneReader(burst_len=512), True)
+    pipelined = bytes_per_cycle(WishboneReader(burst_len=512,
+                                               pipelined=True), True)
+
+    print(f"bytes/cycle: single {single:.2f}, burst {burst:.2f}, "
+          f"pipelined burst {pipelined:.2f}")
+    assert single < burst < pipelined
+
+
+def test_bad_burst_len():
+    with pytest.raises(ValueError):
+        WishboneReader(width=32, burst_len=30)
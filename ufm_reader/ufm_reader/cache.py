@@ -0,0 +1,221 @@
+from enum import Enum
+
+from amaranth import Signal, Module, Memory, Array, Cat
+from amaranth.lib.wiring import Signature, Out, Component
+from amaranth.utils import log2_int
+
+from .page_buffer import page_buffer_signature
+
+
+CacheStatsSignature = Signature({
+    "hits": Out(32),
+    "misses": Out(32),
+})
+
+
+class Replacement(Enum):
+    LRU = "lru"
+    ROUND_ROBIN = "round_robin"
+
+
+# N-line set-associative cache of UFM pages, with the same interface as
+# PageBuffer. Each line holds one page. Line data lives in a Memory, so
+# large caches map onto EBR; tags live in asynchronous-read memories
+# (distributed RAM), one per way.
+#
+# A read counts as a miss if it had to wait for a fill, and as a hit
+# otherwise. Back-to-back valid cycles for the same address are counted
+# once.
+#
+# With a width of 16 or 32, the data memory is that wide (with byte write
+# enables), so a word is read in one access.
+class Cache(Component):
+    def __init__(self, *, lines=4, ways=2, replacement=Replacement.LRU,
+                 width=8):
+        if lines % ways != 0:
+            raise ValueError(f"Number of lines ({lines}) must be a multiple of the number of ways ({ways}).")  # noqa: E501
+
+        super().__init__(Signature({
+            **page_buffer_signature(width).members,
+            "stats": Out(CacheStatsSignature)
+        }))
+
+        self.width = width
+
+        self.lines = lines
+        self.ways = ways
+        self.sets = lines // ways
+        self.replacement = Replacement(replacement)
+
+        # Both must be powers of two.
+        log2_int(self.ways)
+        self.set_bits = log2_int(self.sets)
+        self.tag_bits = 11 - self.set_bits
+
+        self.word_bits = log2_int(width // 8)
+        self.data_mem = Memory(width=width,
+                               depth=(16 >> self.word_bits) * lines)
+        self.tag_mems = [Memory(width=self.tag_bits, depth=self.sets,
+                                name=f"tag_mem_{w}")
+                         for w in range(ways)]
+
+    def elaborate(self, plat):
+        m = Module()
+
+        m.submodules.data_rd = data_rd = self.data_mem.read_port()
+        m.submodules.data_wr = data_wr = \
+            self.data_mem.write_port(granularity=8)
+        tag_rds = []
+        tag_wrs = []
+        for w, mem in enumerate(self.tag_mems):
+            m.submodules[f"tag_rd_{w}"] = rd = mem.read_port(domain="comb")
+            m.submodules[f"tag_wr_{w}"] = wr = mem.write_port()
+            tag_rds.append(rd)
+            tag_wrs.append(wr)
+
+        # Indexed by way * sets + set.
+        line_valid = Signal(self.lines)
+
+        req_set = self.rand.addr[4:4 + self.set_bits]
+        req_tag = self.rand.addr[4 + self.set_bits:]
+        req_hit = Signal(self.ways)
+        hit_way = Signal(range(self.ways))
+        way_valid = Signal(self.ways)
+
+        read_en_delayed = Signal(1)
+        rd_hit = Signal(1)
+        rd_set = Signal.like(req_set)
+        rd_way = Signal.like(hit_way)
+        missed = Signal(1)
+        rd_addr = Signal.like(self.rand.addr)
+        last_addr = Signal.like(self.rand.addr)
+        last_valid = Signal(1)
+
+        fill_set = Signal.like(req_set)
+        fill_way = Signal.like(hit_way)
+        wr_ptr = Signal(4)
+        victim = Signal.like(hit_way)
+
+        # Lookup.
+        for w in range(self.ways):
+            m.d.comb += [
+                tag_rds[w].addr.eq(req_set),
+                way_valid[w].eq(line_valid.bit_select(w * self.sets +
+                                                      req_set, 1)),
+                req_hit[w].eq(way_valid[w] & (tag_rds[w].data == req_tag))
+            ]
+        for w in reversed(range(self.ways)):
+            with m.If(req_hit[w]):
+                m.d.comb += hit_way.eq(w)
+
+        # Hook up unconditional interface logic first.
+        # RAND
+        m.d.comb += [
+            data_rd.addr.eq(Cat(self.rand.addr[self.word_bits:4], req_set,
+                                hit_way)),
+            self.rand.data.eq(data_rd.data)
+        ]
+        # Reads are registered, so it takes one cycle before
+        # they're actually valid.
+        m.d.sync += [
+            read_en_delayed.eq(self.rand.read_en),
+            rd_hit.eq(req_hit.any()),
+            rd_set.eq(req_set),
+            rd_way.eq(hit_way),
+            rd_addr.eq(self.rand.addr)
+        ]
+        m.d.comb += self.rand.valid.eq(read_en_delayed & rd_hit)
+
+        # SEQ
+        m.d.sync += self.seq.stb.eq(0)
+        m.d.comb += [
+            data_wr.addr.eq(Cat(wr_ptr[self.word_bits:], fill_set, fill_way)),
+            data_wr.data.eq(self.seq.data.replicate(self.width // 8))
+        ]
+
+        # Replacement. Invalid ways are always used first.
+        if self.replacement == Replacement.LRU:
+            # Per-set ages; 0 is most recently used.
+            ages = Array(Array(Signal(range(self.ways), reset=w,
+                                      name=f"age_{s}_{w}")
+                               for w in range(self.ways))
+                         for s in range(self.sets))
+
+            def touch(set_, way):
+                for w in range(self.ways):
+                    with m.If(way == w):
+                        m.d.sync += ages[set_][w].eq(0)
+                    with m.Elif(ages[set_][w] < ages[set_][way]):
+                        m.d.sync += ages[set_][w].eq(ages[set_][w] + 1)
+
+            for w in range(self.ways):
+                with m.If(ages[req_set][w] == self.ways - 1):
+                    m.d.comb += victim.eq(w)
+        else:
+            rr = Array(Signal(range(self.ways), name=f"rr_{s}")
+                       for s in range(self.sets))
+
+            def touch(set_, way):
+                pass
+
+            m.d.comb += victim.eq(rr[req_set])
+
+        for w in reversed(range(self.ways)):
+            with m.If(~way_valid[w]):
+                m.d.comb += victim.eq(w)
+
+        m.d.sync += [
+            last_valid.eq(self.rand.valid),
+            last_addr.eq(rd_addr)
+        ]
+        with m.If(self.rand.valid):
+            touch(rd_set, rd_way)
+
+            m.d.sync += missed.eq(0)
+            with m.If(missed):
+                m.d.sync += self.stats.misses.eq(self.stats.misses + 1)
+            with m.Elif(~last_valid | (last_addr != rd_addr)):
+                m.d.sync += self.stats.hits.eq(self.stats.hits + 1)
+
+        with m.FSM():
+            with m.State("IDLE"):
+                with m.If(self.rand.read_en & ~req_hit.any()):
+                    m.d.sync += [
+                        fill_set.eq(req_set),
+                        fill_way.eq(victim),
+                        line_valid.bit_select(victim * self.sets + req_set,
+                                              1).eq(0),
+                        self.seq.addr.eq(self.rand.addr[4:]),
+                        self.seq.stb.eq(1),
+                        missed.eq(1)
+                    ]
+
+                    for w in range(self.ways):
+                        with m.If(victim == w):
+                            m.d.comb += [
+                                tag_wrs[w].addr.eq(req_set),
+                                tag_wrs[w].data.eq(req_tag),
+                                tag_wrs[w].en.eq(1)
+                            ]
+
+                    if self.replacement == Replacement.ROUND_ROBIN:
+                        with m.If(way_valid.all()):
+                            m.d.sync += rr[req_set].eq(rr[req_set] + 1)
+
+                    m.next = "FILL"
+
+            with m.State("FILL"):
+                with m.If(self.seq.ack):
+                    m.d.comb += data_wr.en.eq(1 << wr_ptr[:self.word_bits])
+                    m.d.sync += wr_ptr.eq(wr_ptr + 1)
+
+                    # Don't ask for a byte past the end of the page; the
+                    # streamer would take it as a request for a new page.
+                    with m.If(wr_ptr == 15):
+                        m.d.sync += line_valid.bit_select(
+                            fill_way * self.sets + fill_set, 1).eq(1)
+                        m.next = "IDLE"
+                    with m.Else():
+                        m.d.sync += self.seq.stb.eq(1)
+
+        return m
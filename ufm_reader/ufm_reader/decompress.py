@@ -0,0 +1,197 @@
+from amaranth import Signal, Module, Memory, Mux, Array, Cat
+from amaranth.lib.wiring import In, Out, Component
+
+from .image import PAGE_SIZE
+from .page_buffer import SeqSignature
+from .streamer import StreamerSignature
+
+
+# Sits between a PageBuffer (or Cache) and the Streamer, and serves pages
+# of an image compressed by image.compress. index is the image's index,
+# and base_page the UFM page the compressed data starts at.
+#
+# Page requests on seq are for uncompressed pages. Each one is looked up
+# in a ROM built from index, to find the UFM page(s) holding its block.
+# The last two UFM pages read are kept in a small buffer (distributed RAM,
+# one slot for even pages and one for odd), so the blocks of several
+# uncompressed pages usually come out of a single UFM read. Missing pages
+# are read in a single request, and decoding starts as soon as the first
+# byte of the block lands. Decoded bytes are acked to seq, one per cycle at
+# best.
+#
+# Pages past the end of the index read back as garbage; see Reader, which
+# keeps prefetches within the image.
+class Decompressor(Component):
+    seq: In(SeqSignature)
+    stream: Out(StreamerSignature)
+
+    def __init__(self, *, index, base_page=0):
+        super().__init__()
+        self.num_pages = len(index)
+        self.base_page = base_page
+
+        if base_page + (max(o + n for o, n in index) + PAGE_SIZE - 1) // \
+                PAGE_SIZE > 2048:
+            raise ValueError("Compressed image goes past the end of the UFM.")  # noqa: E501
+
+        # Offset in the low 15 bits, length - 1 above it.
+        self.index_rom = Memory(width=20, depth=len(index),
+                                init=[o | ((n - 1) << 15)
+                                      for (o, n) in index])
+        self.buf = Memory(width=8, depth=2 * PAGE_SIZE)
+
+    def elaborate(self, plat):
+        m = Module()
+
+        m.submodules.index_rd = index_rd = self.index_rom.read_port()
+        m.submodules.buf_rd = buf_rd = self.buf.read_port(domain="comb")
+        m.submodules.buf_wr = buf_wr = self.buf.write_port()
+
+        # Which UFM page each buffer slot holds.
+        tags = Array(Signal(11, name=f"tag_{i}") for i in range(2))
+        tag_valid = Signal(2)
+
+        # Byte address in the UFM of the next byte of the block to decode.
+        rd = Signal(15)
+        rd_avail = Signal(1)
+
+        # UFM pages being read into the buffer; held for the Streamer,
+        # which may only act on the request later.
+        fill_page = Signal(11)
+        fill_pages = Signal(2)
+        wr_ptr = Signal(4)
+        acks_left = Signal(range(2 * PAGE_SIZE + 1))
+
+        out_left = Signal(range(PAGE_SIZE + 1))
+        # A new page request that came in while the last block's UFM pages
+        # were still being read.
+        pending = Signal(1)
+
+        count = Signal(5)
+        run_byte = Signal(8)
+
+        start = Signal(15)
+        first_page = start[4:]
+        last_page = Signal(11)
+        first_hit = Signal(1)
+        last_hit = Signal(1)
+
+        def holds(page):
+            return tag_valid.bit_select(page[0], 1) & (tags[page[0]] == page)
+
+        m.d.comb += [
+            index_rd.addr.eq(self.seq.addr),
+            start.eq(self.base_page * PAGE_SIZE + index_rd.data[:15]),
+            last_page.eq((start + index_rd.data[15:])[4:]),
+            first_hit.eq(holds(first_page)),
+            last_hit.eq(holds(last_page)),
+
+            self.stream.addr.eq(fill_page),
+            self.stream.pages.eq(fill_pages),
+            self.stream.stall.eq(0),
+
+            buf_rd.addr.eq(rd[:5]),
+            rd_avail.eq(holds(rd[4:]) |
+                        ((acks_left != 0) & (fill_page == rd[4:]) &
+                         (rd[:4] < wr_ptr))),
+            buf_wr.addr.eq(Cat(wr_ptr, fill_page[0])),
+            buf_wr.data.eq(self.stream.data),
+        ]
+
+        with m.If(self.stream.ack):
+            m.d.comb += buf_wr.en.eq(1)
+            m.d.sync += [
+                acks_left.eq(acks_left - 1),
+                wr_ptr.eq(wr_ptr + 1)
+            ]
+            with m.If(wr_ptr == PAGE_SIZE - 1):
+                m.d.sync += [
+                    tags[fill_page[0]].eq(fill_page),
+                    tag_valid.bit_select(fill_page[0], 1).eq(1),
+                    fill_page.eq(fill_page + 1)
+                ]
+
+        def fetch(page, pages):
+            m.d.sync += [
+                fill_page.eq(page),
+                fill_pages.eq(pages),
+                acks_left.eq(pages * PAGE_SIZE),
+                wr_ptr.eq(0),
+                tag_valid.bit_select(page[0], 1).eq(0),
+            ]
+            with m.If(pages == 2):
+                m.d.sync += tag_valid.eq(0)
+            m.next = "REQUEST"
+
+        with m.FSM(name="fetch"):
+            with m.State("IDLE"):
+                with m.If(self.seq.stb | pending):
+                    m.d.sync += pending.eq(0)
+                    m.next = "LOOKUP"
+
+            # Index read is registered.
+            with m.State("LOOKUP"):
+                m.d.sync += [
+                    rd.eq(start),
+                    out_left.eq(PAGE_SIZE)
+                ]
+
+                with m.If(first_hit & last_hit):
+                    m.next = "BUSY"
+                with m.Elif(first_hit):
+                    fetch(last_page, 1)
+                with m.Else():
+                    fetch(first_page, Mux(last_page == first_page, 1, 2))
+
+            # The Streamer samples pages along with stb.
+            with m.State("REQUEST"):
+                m.d.comb += self.stream.stb.eq(1)
+                m.next = "BUSY"
+
+            with m.State("BUSY"):
+                with m.If(self.seq.stb & (out_left == 0)):
+                    m.d.sync += pending.eq(1)
+
+                with m.If((acks_left == 0) & (out_left == 0)):
+                    m.next = "IDLE"
+
+        def take():
+            m.d.sync += rd.eq(rd + 1)
+
+        def emit(data):
+            m.d.comb += [
+                self.seq.data.eq(data),
+                self.seq.ack.eq(1)
+            ]
+            m.d.sync += [
+                count.eq(count - 1),
+                out_left.eq(out_left - 1)
+            ]
+            with m.If(count == 1):
+                m.next = "CTRL"
+
+        with m.FSM(name="decode"):
+            with m.State("CTRL"):
+                with m.If(rd_avail & (out_left != 0)):
+                    take()
+                    m.d.sync += count.eq(buf_rd.data[:4] + 1)
+                    with m.If(buf_rd.data[7]):
+                        m.next = "RUN_BYTE"
+                    with m.Else():
+                        m.next = "LITERAL"
+
+            with m.State("RUN_BYTE"):
+                with m.If(rd_avail):
+                    take()
+                    m.d.sync += run_byte.eq(buf_rd.data)
+                    m.next = "RUN"
+
+            with m.State("RUN"):
+                emit(run_byte)
+
+            with m.State("LITERAL"):
+                with m.If(rd_avail):
+                    take()
+                    emit(buf_rd.data)
+
+        return m
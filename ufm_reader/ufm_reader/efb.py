@@ -4,6 +4,32 @@ from amaranth.lib.wiring import In, Component
 from .sequencer import EfbWishbone
 
 
+# Last UFM page of each device density. The UFM is pages 0 up to this.
+UFM_END_PAGE = {
+    "7000L": 2045,
+    "4000L": 766,
+    "2000U": 766,
+    "2000L": 638,
+    "1200U": 638,
+    "1200L": 510,
+    "640U": 510,
+    "640L": 190
+}
+
+# Number of 9 Kbit EBR blocks on each device density. Each holds 1 KB at
+# 8 bits wide.
+EBR_BLOCKS = {
+    "7000L": 26,
+    "4000L": 10,
+    "2000U": 10,
+    "2000L": 8,
+    "1200U": 8,
+    "1200L": 7,
+    "640U": 7,
+    "640L": 2
+}
+
+
 class EFB(Component):
     bus: In(EfbWishbone)
 
@@ -51,20 +77,9 @@ class EFB(Component):
         if not self.ufm_config:
             return
 
-        ufm_end_page = {
-            "7000L": 2045,
-            "4000L": 766,
-            "2000U": 766,
-            "2000L": 638,
-            "1200U": 638,
-            "1200L": 510,
-            "640U": 510,
-            "640L": 190
-        }
-
         start_page = 0 if self.ufm_config["zero_mem"] else \
             self.ufm_config["start_page"]
-        init_pages = ufm_end_page[self.efb_config["dev_density"]] if \
+        init_pages = UFM_END_PAGE[self.efb_config["dev_density"]] if \
             self.ufm_config["zero_mem"] else self.ufm_config["num_pages"]
 
         self.params.update({
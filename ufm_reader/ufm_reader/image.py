@@ -0,0 +1,417 @@
+from pathlib import Path
+import argparse
+import io
+import os
+import struct
+
+from .efb import UFM_END_PAGE
+
+
+PAGE_SIZE = 16
+CHUNK_SIZE = 4096
+
+
+# Converts binary, Intel HEX and ELF files to the format Diamond takes for
+# UFM_INIT_FILE_NAME (one 16-byte page per line, in hex; see
+# sim.load_mem), and works out the ufm_config to place them at the end of
+# the UFM. Inputs are read a chunk or record at a time; only one page of
+# output is held in memory.
+#
+#     python -m ufm_reader.image firmware.elf init.mem --device 7000L
+
+
+# Each reader yields (address, data) in increasing address order.
+def read_bin(fp):
+    addr = 0
+    while data := fp.read(CHUNK_SIZE):
+        yield (addr, data)
+        addr += len(data)
+
+
+def read_ihex(fp):
+    base = 0
+    for lineno, line in enumerate(fp, 1):
+        line = line.strip()
+        if not line:
+            continue
+
+        if not line.startswith(":"):
+            raise ValueError(f"line {lineno}: Intel HEX records start with ':'")  # noqa: E501
+        rec = bytes.fromhex(line[1:])
+        if len(rec) < 5 or len(rec) != rec[0] + 5:
+            raise ValueError(f"line {lineno}: bad record length")
+        if sum(rec) & 0xff:
+            raise ValueError(f"line {lineno}: bad checksum")
+
+        (_, offset, rtype) = struct.unpack(">BHB", rec[:4])
+        data = rec[4:-1]
+        if rtype == 0x00:
+            yield (base + offset, data)
+        elif rtype == 0x01:
+            return
+        elif rtype == 0x02:
+            base = int.from_bytes(data, "big") << 4
+        elif rtype == 0x04:
+            base = int.from_bytes(data, "big") << 16
+        # 0x03 and 0x05 are start addresses, which don't go in the UFM.
+
+
+SHT_PROGBITS = 1
+SHF_ALLOC = 2
+PT_LOAD = 1
+
+ELF_HEADER = {
+    1: "HHIIIIIHHHHHH",  # ELFCLASS32
+    2: "HHIQQQIHHHHHH",  # ELFCLASS64
+}
+
+ELF_SECTION = {
+    1: "IIIIIIIIII",
+    2: "IIQQQQIIQQ",
+}
+
+# Fields in the ELFCLASS32 order: p_type, p_offset, p_vaddr, p_paddr,
+# p_filesz, ... ELFCLASS64 moves p_flags up to second.
+ELF_SEGMENT = {
+    1: "IIIIIIII",
+    2: "IIQQQQQQ",
+}
+
+
+# Yields the contents of the named section, or of every allocated
+# section with contents (the same as objcopy -O binary) if section is
+# None. As with objcopy, sections are placed at their load address, from
+# the PT_LOAD segment holding them; sections outside any segment are
+# placed at their (virtual) address.
+def read_elf(fp, section=None):
+    ident = fp.read(16)
+    if ident[:4] != b"\x7fELF":
+        raise ValueError("not an ELF file")
+
+    (ei_class, ei_data) = ident[4:6]
+    if ei_class not in ELF_HEADER or ei_data not in (1, 2):
+        raise ValueError("unknown ELF class or byte order")
+    endian = "<" if ei_data == 1 else ">"
+
+    hdr = endian + ELF_HEADER[ei_class]
+    fields = struct.unpack(hdr, fp.read(struct.calcsize(hdr)))
+    (phoff, shoff) = fields[4:6]
+    (phentsize, phnum, shentsize, shnum, shstrndx) = fields[8:]
+
+    phdr = endian + ELF_SEGMENT[ei_class]
+    loads = []
+    for i in range(phnum):
+        fp.seek(phoff + i * phentsize)
+        ph = struct.unpack(phdr, fp.read(struct.calcsize(phdr)))
+        if ei_class == 2:
+            ph = (ph[0], *ph[2:])
+        (p_type, p_offset, _, p_paddr, p_filesz, *_) = ph
+        if p_type == PT_LOAD:
+            loads.append((p_offset, p_filesz, p_paddr))
+
+    shdr = endian + ELF_SECTION[ei_class]
+    sections = []
+    for i in range(shnum):
+        fp.seek(shoff + i * shentsize)
+        sections.append(struct.unpack(shdr,
+                                      fp.read(struct.calcsize(shdr))))
+
+    (_, _, _, _, str_off, str_size, *_) = sections[shstrndx]
+    fp.seek(str_off)
+    strtab = fp.read(str_size)
+
+    def name(sh):
+        return strtab[sh[0]:strtab.index(b"\0", sh[0])].decode()
+
+    if section is None:
+        chosen = [sh for sh in sections if sh[1] == SHT_PROGBITS and
+                  sh[2] & SHF_ALLOC and sh[5]]
+    else:
+        chosen = [sh for sh in sections if name(sh) == section]
+        if not chosen:
+            raise ValueError(f"no section named {section}")
+        if chosen[0][1] != SHT_PROGBITS:
+            raise ValueError(f"section {section} has no contents")
+
+    def load_addr(sh):
+        (_, _, _, addr, offset, size, *_) = sh
+        for (p_offset, p_filesz, p_paddr) in loads:
+            if p_offset <= offset and offset + size <= p_offset + p_filesz:
+                return p_paddr + offset - p_offset
+        return addr
+
+    placed = sorted((load_addr(sh), sh[4], sh[5]) for sh in chosen)
+    for (addr, offset, size) in placed:
+        for pos in range(0, size, CHUNK_SIZE):
+            fp.seek(offset + pos)
+            yield (addr + pos, fp.read(min(CHUNK_SIZE, size - pos)))
+
+
+# Write chunks from one of the readers above as pages to out, a text file.
+# The image starts at the first chunk's address (or at base, if given).
+# Gaps are filled with fill. Raises ValueError as soon as the image grows
+# past max_pages. Returns the number of pages written.
+def write_mem(chunks, out, *, base=None, fill=0, max_pages=None):
+    page = bytearray()
+    pages = 0
+    pos = base
+
+    def emit(data):
+        nonlocal page, pages
+        page += data
+        while len(page) >= PAGE_SIZE:
+            if max_pages is not None and pages == max_pages:
+                raise ValueError(f"image is larger than {max_pages} pages")
+            out.write(page[:PAGE_SIZE].hex() + "\n")
+            page = page[PAGE_SIZE:]
+            pages += 1
+
+    for (addr, data) in chunks:
+        if pos is None:
+            pos = addr
+        if addr < pos:
+            raise ValueError(f"data at {addr:#x} overlaps or is out of order")  # noqa: E501
+
+        while pos < addr:
+            gap = min(addr - pos, CHUNK_SIZE)
+            emit(bytes([fill]) * gap)
+            pos += gap
+
+        emit(data)
+        pos += len(data)
+
+    if page:
+        emit(bytes([fill]) * (PAGE_SIZE - len(page)))
+
+    return pages
+
+
+# Compressed images hold each 16-byte page as its own block of run-length
+# tokens, so that any page can be decompressed without the ones before it
+# (see decompress.Decompressor). A token is a control byte c, followed by:
+#
+# * c < 0x80: c + 1 (up to 16) literal bytes.
+# * c >= 0x80: one byte, repeated c - 0x7f (up to 16) times.
+#
+# Blocks are packed back to back, without regard for page boundaries, and
+# identical pages share a block. The index has an (offset, length) pair
+# per page, giving where its block starts in the compressed data and how
+# long it is.
+RLE_RUN = 0x80
+# The Reader's bus address is 15 bits.
+MAX_PAGES = 2048
+
+
+def rle_encode(page):
+    out = bytearray()
+    lit = bytearray()
+
+    def flush():
+        if lit:
+            out.append(len(lit) - 1)
+            out.extend(lit)
+            lit.clear()
+
+    i = 0
+    while i < len(page):
+        run = 1
+        while i + run < len(page) and page[i + run] == page[i] and \
+                run < PAGE_SIZE:
+            run += 1
+
+        # A run of two costs as much as two literals.
+        if run > 2:
+            flush()
+            out += bytes([RLE_RUN | (run - 1), page[i]])
+            i += run
+        else:
+            if len(lit) == PAGE_SIZE:
+                flush()
+            lit.append(page[i])
+            i += 1
+
+    flush()
+    return bytes(out)
+
+
+# Decompress the block at the start of data; returns the page and the
+# number of bytes used.
+def rle_decode(data):
+    page = bytearray()
+    pos = 0
+    while len(page) < PAGE_SIZE:
+        c = data[pos]
+        if c & RLE_RUN:
+            page += bytes([data[pos + 1]]) * ((c & 0x7f) + 1)
+            pos += 2
+        else:
+            page += data[pos + 1:pos + c + 2]
+            pos += c + 2
+
+    if len(page) != PAGE_SIZE:
+        raise ValueError("block doesn't decompress to one page")
+    return (bytes(page), pos)
+
+
+# Returns the compressed data and the index.
+def compress(pages):
+    data = bytearray()
+    index = []
+    blocks = {}
+    for page in pages:
+        page = bytes(page)
+        if page not in blocks:
+            block = rle_encode(page)
+            blocks[page] = (len(data), len(block))
+            data += block
+        index.append(blocks[page])
+
+    if len(index) > MAX_PAGES:
+        raise ValueError(f"image is larger than {MAX_PAGES} pages")
+    return (bytes(data), index)
+
+
+# Index files have an entry per line: offset and length, in hex.
+def save_index(index, filename):
+    with open(filename, "w") as fp:
+        for (offset, length) in index:
+            fp.write(f"{offset:04x} {length:02x}\n")
+
+
+def load_index(filename):
+    with open(filename) as fp:
+        return [tuple(int(f, 16) for f in line.split())
+                for line in fp if line.strip()]
+
+
+# Runs of pages that hold a single byte value throughout, as (first page,
+# last page, value), for PageBuffer's uniform map. Pages are numbered from
+# start_page, and runs shorter than min_pages are left out.
+def uniform_runs(pages, start_page=0, min_pages=1):
+    runs = []
+    for i, page in enumerate(pages, start_page):
+        if len(set(page)) != 1:
+            continue
+
+        value = page[0]
+        if runs and runs[-1][1] == i - 1 and runs[-1][2] == value:
+            runs[-1] = (runs[-1][0], i, value)
+        else:
+            runs.append((i, i, value))
+
+    return [r for r in runs if r[1] - r[0] + 1 >= min_pages]
+
+
+# ufm_config (as taken by EFB and Demo) for num_pages pages at the end of
+# the UFM.
+def ufm_config(num_pages, dev_density, init_mem):
+    end_page = UFM_END_PAGE[dev_density]
+    if num_pages > end_page + 1:
+        raise ValueError(f"{num_pages} pages don't fit in the {end_page + 1} page UFM of a {dev_density} device")  # noqa: E501
+
+    return {
+        "init_mem": init_mem,
+        "start_page": end_page - num_pages + 1,
+        "num_pages": num_pages,
+        "zero_mem": False
+    }
+
+
+def guess_format(filename):
+    with open(filename, "rb") as fp:
+        if fp.read(4) == b"\x7fELF":
+            return "elf"
+
+    if Path(filename).suffix.lower() in (".hex", ".ihex", ".ihx"):
+        return "ihex"
+
+    return "bin"
+
+
+# Convert src to a UFM initialization file at dst, and return its
+# ufm_config. fmt is "bin", "ihex" or "elf", or None to guess. dst is only
+# replaced if the whole image fits.
+#
+# If compress is True, the image is compressed (see compress), and the
+# index is written to dst with ".idx" appended. The uncompressed image is
+# held in memory, but is at most MAX_PAGES pages.
+def convert(src, dst, *, dev_density, fmt=None, section=None, fill=0,
+            compress_image=False):
+    if dev_density not in UFM_END_PAGE:
+        raise ValueError(f"unknown device density {dev_density}")
+    max_pages = UFM_END_PAGE[dev_density] + 1
+
+    fmt = fmt or guess_format(src)
+    if fmt == "bin":
+        # Size is known up front, so fail before reading anything.
+        if os.path.getsize(src) > max_pages * PAGE_SIZE:
+            raise ValueError(f"image is larger than {max_pages} pages")
+        fp = open(src, "rb")
+        chunks = read_bin(fp)
+        base = 0
+    elif fmt == "ihex":
+        fp = open(src)
+        chunks = read_ihex(fp)
+        base = None
+    elif fmt == "elf":
+        fp = open(src, "rb")
+        chunks = read_elf(fp, section)
+        base = None
+    else:
+        raise ValueError(f"unknown input format {fmt}")
+
+    tmp = Path(f"{dst}.{os.getpid()}.tmp")
+    try:
+        with fp, open(tmp, "w") as out:
+            if compress_image:
+                raw = io.StringIO()
+                write_mem(chunks, raw, base=base, fill=fill,
+                          max_pages=MAX_PAGES)
+                (data, index) = compress(bytes.fromhex(line)
+                                         for line in raw.getvalue().split())
+                (chunks, base) = ([(0, data)], 0)
+
+            num_pages = write_mem(chunks, out, base=base, fill=fill,
+                                  max_pages=max_pages)
+        if not num_pages:
+            raise ValueError("image is empty")
+        if compress_image:
+            save_index(index, f"{dst}.idx")
+        os.replace(tmp, dst)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+    return ufm_config(num_pages, dev_density, str(dst))
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Convert a binary, Intel HEX or ELF file to a UFM initialization file.")  # noqa: E501
+    parser.add_argument("input")
+    parser.add_argument("output")
+    parser.add_argument("-d", "--device", required=True,
+                        choices=list(UFM_END_PAGE),
+                        help="device density")
+    parser.add_argument("-f", "--format", choices=["bin", "ihex", "elf"],
+                        help="input format (default: guess)")
+    parser.add_argument("-s", "--section",
+                        help="ELF section (default: all allocated sections)")  # noqa: E501
+    parser.add_argument("--fill", type=lambda s: int(s, 0), default=0,
+                        help="byte for gaps and the end of the last page")
+    parser.add_argument("-c", "--compress", action="store_true",
+                        help="compress, and write the index to OUTPUT.idx")
+    args = parser.parse_args(args)
+
+    cfg = convert(args.input, args.output, dev_density=args.device,
+                  fmt=args.format, section=args.section, fill=args.fill,
+                  compress_image=args.compress)
+    print(f"ufm_config: {{ init_mem: \"{cfg['init_mem']}\", "
+          f"start_page: {cfg['start_page']}, "
+          f"num_pages: {cfg['num_pages']}, zero_mem: false }}")
+    if args.compress:
+        print(f"decompress: {{ index: \"{args.output}.idx\", "
+              f"base_page: {cfg['start_page']} }}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+from pathlib import Path
+import argparse
+import io
+import os
+import re
+
+from .efb import UFM_END_PAGE
+from .image import PAGE_SIZE, guess_format, read_bin, read_elf, \
+    read_ihex, write_mem
+
+
+STX = "\x02"
+ETX = "\x03"
+ROW_FUSES = 8 * PAGE_SIZE
+
+
+# Rewrite the UFM in a JEDEC file from Diamond, so that changing flash
+# contents doesn't need synthesis and place-and-route to run again:
+#
+#     python -m ufm_reader.jedec old.jed init.mem new.jed --device 7000L
+#
+# The UFM is the L field after "NOTE TAG DATA", one 128-fuse row per
+# page, byte 0 first and most significant bit first within each byte.
+# Only the rows of the new image are replaced; everything else is copied
+# through as is. The fuse checksum (C field) is recalculated, and so is
+# the transmission checksum after ETX, unless it was 0000 (not checked).
+class Jedec:
+    def __init__(self, text):
+        start = text.index(STX)
+        end = text.index(ETX)
+        self.head = text[:start + 1]
+        self.tail = text[end + 5:]
+        self.xmit_checksum = text[end + 1:end + 5]
+        # Fields keep their surrounding whitespace, so that writing them
+        # back out reproduces the file.
+        self.fields = text[start + 1:end].split("*")
+
+        self.num_fuses = None
+        self.default = 0
+        self.ufm = None
+        self.checksum = None
+        for i, field in enumerate(self.fields):
+            f = field.strip()
+            if f.startswith("QF"):
+                self.num_fuses = int(f[2:])
+            elif re.fullmatch(r"F[01]", f):
+                self.default = int(f[1])
+            elif f.startswith("L") and self.ufm is None and \
+                    self.fields[i - 1].strip() == "NOTE TAG DATA":
+                self.ufm = i
+            elif re.fullmatch(r"C[0-9A-Fa-f]{4}", f):
+                self.checksum = i
+
+        if self.num_fuses is None:
+            raise ValueError("no QF (fuse count) field")
+        if self.ufm is None:
+            raise ValueError("no UFM (NOTE TAG DATA) in JEDEC file")
+        if self.checksum is None:
+            raise ValueError("no C (fuse checksum) field")
+        if any(len(row) != ROW_FUSES for row in self.ufm_rows()):
+            raise ValueError(f"UFM rows aren't all {ROW_FUSES} fuses")
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename, newline="") as fp:
+            return cls(fp.read())
+
+    def l_field(self, i):
+        (addr, *rows) = self.fields[i].split()
+        return (int(addr[1:]), rows)
+
+    def ufm_rows(self):
+        return self.l_field(self.ufm)[1]
+
+    # Replace UFM pages from start_page on with pages, lists of 16 bytes.
+    def patch_ufm(self, start_page, pages):
+        field = self.fields[self.ufm]
+        (_, rows) = self.l_field(self.ufm)
+        if len(pages) > len(rows):
+            raise ValueError(f"{len(pages)} pages don't fit in the {len(rows)} page UFM")  # noqa: E501
+        if start_page < 0:
+            raise ValueError(f"start page {start_page} is negative")
+        if start_page + len(pages) > len(rows):
+            raise ValueError(f"pages {start_page}-{start_page + len(pages) - 1} are past the end of the {len(rows)} page UFM")  # noqa: E501
+
+        for i, page in enumerate(pages):
+            if len(page) != PAGE_SIZE:
+                raise ValueError(f"page {i} is {len(page)} bytes, not {PAGE_SIZE}")  # noqa: E501
+            rows[start_page + i] = "".join(f"{b:08b}" for b in page)
+
+        # Keep the whitespace around the field and its line endings.
+        lead = field[:len(field) - len(field.lstrip())]
+        trail = field[len(field.rstrip()):]
+        nl = "\r\n" if "\r\n" in field else "\n"
+        self.fields[self.ufm] = lead + nl.join([field.split()[0], *rows]) + \
+            trail
+
+    # 16-bit sum of the fuses, 8 at a time, with the lowest-numbered fuse
+    # as the least significant bit. Fuses not in any L field have the F
+    # default.
+    def fuse_checksum(self):
+        fuses = bytearray([0xff if self.default else 0]) * \
+            -(-self.num_fuses // 8)
+
+        for i, field in enumerate(self.fields):
+            if not field.strip().startswith("L"):
+                continue
+
+            (addr, rows) = self.l_field(i)
+            bits = "".join(rows)
+            head = -addr % 8
+            if head:
+                # Fuses before the next byte boundary, a bit at a time.
+                for n, b in enumerate(bits[:head]):
+                    mask = 1 << ((addr + n) % 8)
+                    fuses[(addr + n) // 8] = \
+                        (fuses[(addr + n) // 8] & ~mask) | (int(b) * mask)
+                (addr, bits) = (addr + head, bits[head:])
+
+            whole = len(bits) // 8 * 8
+            if whole:
+                fuses[addr // 8:(addr + whole) // 8] = \
+                    int(bits[whole - 1::-1], 2).to_bytes(whole // 8,
+                                                         "little")
+            for n, b in enumerate(bits[whole:], addr + whole):
+                mask = 1 << (n % 8)
+                fuses[n // 8] = (fuses[n // 8] & ~mask) | (int(b) * mask)
+
+        # Bits past the last fuse don't count.
+        if self.num_fuses % 8:
+            fuses[-1] &= (1 << (self.num_fuses % 8)) - 1
+
+        return sum(fuses) & 0xffff
+
+    def dumps(self):
+        field = self.fields[self.checksum]
+        self.fields[self.checksum] = field.replace(
+            field.strip(), f"C{self.fuse_checksum():04X}")
+
+        body = self.head + "*".join(self.fields) + ETX
+        if self.xmit_checksum != "0000":
+            xmit = f"{sum(body[body.index(STX):].encode('latin-1')) & 0xffff:04X}"  # noqa: E501
+        else:
+            xmit = "0000"
+
+        return body + xmit + self.tail
+
+    def save(self, filename):
+        tmp = Path(f"{filename}.{os.getpid()}.tmp")
+        try:
+            with open(tmp, "w", newline="") as fp:
+                fp.write(self.dumps())
+            os.replace(tmp, filename)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+
+# Read a UFM image as pages, in any format ufm_reader.image takes or as a
+# UFM initialization file.
+def load_image(filename, fmt=None, section=None, fill=0):
+    if fmt is None:
+        fmt = "mem" if Path(filename).suffix.lower() == ".mem" else \
+            guess_format(filename)
+
+    if fmt == "mem":
+        with open(filename) as fp:
+            lines = fp.read().split()
+    else:
+        readers = {
+            "bin": read_bin,
+            "ihex": read_ihex,
+            "elf": lambda fp: read_elf(fp, section),
+        }
+        if fmt not in readers:
+            raise ValueError(f"unknown input format {fmt}")
+
+        out = io.StringIO()
+        with open(filename, "r" if fmt == "ihex" else "rb") as fp:
+            write_mem(readers[fmt](fp), out, base=0 if fmt == "bin" else None,
+                      fill=fill)
+        lines = out.getvalue().split()
+
+    return [list(bytes.fromhex(line)) for line in lines]
+
+
+# Write a copy of the JEDEC file src to dst, with pages from the image
+# starting at start_page (by default, so that the image ends at the end of
+# the UFM, like image.ufm_config).
+def patch(src, image, dst, *, dev_density, start_page=None, fmt=None,
+          section=None, fill=0):
+    jed = Jedec.load(src)
+    pages = load_image(image, fmt, section, fill)
+
+    ufm_pages = UFM_END_PAGE[dev_density] + 1
+    if len(jed.ufm_rows()) != ufm_pages:
+        raise ValueError(f"{src} has {len(jed.ufm_rows())} UFM pages, but a {dev_density} device has {ufm_pages}")  # noqa: E501
+    if len(pages) > ufm_pages:
+        raise ValueError(f"{image} is {len(pages)} pages, but a {dev_density} device's UFM only has {ufm_pages}")  # noqa: E501
+    if start_page is None:
+        start_page = ufm_pages - len(pages)
+
+    jed.patch_ufm(start_page, pages)
+    jed.save(dst)
+    return (start_page, len(pages))
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Replace the UFM contents of a JEDEC file.")
+    parser.add_argument("jedec")
+    parser.add_argument("image")
+    parser.add_argument("output")
+    parser.add_argument("-d", "--device", required=True,
+                        choices=list(UFM_END_PAGE),
+                        help="device density")
+    parser.add_argument("-p", "--start-page", type=int,
+                        help="first page to write (default: so the image ends at the end of the UFM)")  # noqa: E501
+    parser.add_argument("-f", "--format",
+                        choices=["mem", "bin", "ihex", "elf"],
+                        help="image format (default: guess)")
+    parser.add_argument("-s", "--section",
+                        help="ELF section (default: all allocated sections)")  # noqa: E501
+    parser.add_argument("--fill", type=lambda s: int(s, 0), default=0,
+                        help="byte for gaps and the end of the last page")
+    args = parser.parse_args(args)
+
+    (start_page, num_pages) = patch(args.jedec, args.image, args.output,
+                                    dev_density=args.device,
+                                    start_page=args.start_page,
+                                    fmt=args.format, section=args.section,
+                                    fill=args.fill)
+    print(f"Wrote UFM pages {start_page}-{start_page + num_pages - 1} to {args.output}.")  # noqa: E501
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,9 @@
-from amaranth import Signal, Module
+from enum import Enum
+
+from amaranth import Signal, Module, Array, Cat, Mux, signed
 from amaranth.lib.data import ArrayLayout
 from amaranth.lib.wiring import Signature, In, Out, Component
+from amaranth.utils import log2_int
 
 
 SeqSignature = Signature({
@@ -11,74 +14,218 @@ SeqSignature = Signature({
 })
 
 
-RandSignature = Signature({
-    "data": In(8),
-    "addr": Out(15),
-    "read_en": Out(1),
-    "flush": Out(1),
-    "valid": In(1)
-})
-
-
+# addr is always a byte address. For widths above 8, the low address bits
+# are ignored (reads are aligned), and the byte at the lowest address is in
+# the low bits of data.
+def rand_signature(width=8):
+    if width not in (8, 16, 32):
+        raise ValueError(f"Data width must be 8, 16, or 32, not {width}.")
+
+    return Signature({
+        "data": In(width),
+        "addr": Out(15),
+        "read_en": Out(1),
+        "flush": Out(1),
+        "valid": In(1)
+    })
+
+
+RandSignature = rand_signature()
+
+
+def page_buffer_signature(width):
+    return Signature({
+        "rand": In(rand_signature(width)),
+        "seq": Out(SeqSignature)
+    })
+
+
+# Which page to fetch into the spare bank while the consumer is reading
+# from the other one.
+class Prefetch(Enum):
+    OFF = "off"
+    NEXT_PAGE = "next"  # The page after the one being read.
+    STRIDE = "stride"  # Same distance as between the last two pages read.
+
+
+# Two-bank page buffer. The consumer reads from whichever bank holds the
+# requested page, while the sequencer side fills the other bank, either on
+# a miss or ahead of time according to the prefetch policy. Prefetches
+# never go past max_page.
+#
+# Pages are filled in order, and a read of the page being filled is served
+# as soon as the requested byte has landed, rather than at the end of the
+# fill.
+#
+# With a width of 16 or 32, a whole word is read out of the bank at once.
+#
+# uniform is a list of (first page, last page, value) runs of pages known
+# at build time to hold nothing but value (see image.uniform_runs). Reads
+# from them are answered with value straight away, and they are never
+# filled or prefetched. The UFM must still hold the image the runs came
+# from.
 class PageBuffer(Component):
-    rand: In(RandSignature)
-    seq: Out(SeqSignature)
-
-    def __init__(self):
-        super().__init__()
-        self.buf = Signal(ArrayLayout(8, 16), reset_less=True)
+    def __init__(self, *, prefetch=Prefetch.OFF, max_page=2047, width=8,
+                 uniform=()):
+        super().__init__(page_buffer_signature(width))
+        self.width = width
+        self.prefetch = Prefetch(prefetch)
+        self.max_page = max_page
+        self.uniform = list(uniform)
+        self.buf = Signal(ArrayLayout(ArrayLayout(8, 16), 2), reset_less=True)
 
     def elaborate(self, plat):
         m = Module()
 
         read_en_delayed = Signal(1)
-        curr_page = Signal(11)
+        rd_page = Signal(11)
+        rd_ptr = Signal(4)
+
+        tags = Array(Signal(11, name=f"tag_{i}") for i in range(2))
+        tag_valid = Signal(2)
+        req_hit = Signal(2)
+        rd_hit = Signal(2)
+        rd_partial = Signal(1)
+        rd_bank = Signal(1)
+        # Bank the consumer last read from; the other one gets refilled.
+        mru = Signal(1)
+
+        fill_bank = Signal(1)
+        fill_page = Signal(11)
         wr_ptr = Signal(4)
-        rd_ptr = Signal.like(wr_ptr)
+        filling = Signal(1)
+        demand_miss = Signal(1)
+
+        cur_page = Signal(11)
+        prev_page = Signal(11)
+        cur_valid = Signal(1)
+        prev_valid = Signal(1)
+        next_page = Signal(signed(13))
+        predictable = Signal(1)
+        do_prefetch = Signal(1)
+
+        req_page = self.rand.addr[4:]
+
+        # Page is in one of the uniform runs, and what it holds.
+        def uniform(page, name):
+            hit = Signal(1, name=f"{name}_uniform")
+            value = Signal(8, name=f"{name}_value")
+            for (first, last, v) in self.uniform:
+                with m.If((page >= first) & (page <= last)):
+                    m.d.comb += [
+                        hit.eq(1),
+                        value.eq(v)
+                    ]
+            return (hit, value)
+
+        (req_uniform, req_value) = uniform(req_page, "req")
+        rd_uniform = Signal(1)
+        rd_value = Signal(8)
+        for i in range(2):
+            m.d.comb += [
+                req_hit[i].eq(tag_valid[i] & (tags[i] == req_page)),
+                rd_hit[i].eq(tag_valid[i] & (tags[i] == rd_page))
+            ]
+
+        # Bytes below wr_ptr of the page being filled have already landed.
+        m.d.comb += rd_partial.eq(filling & (fill_page == rd_page) &
+                                  ((rd_ptr | (self.width // 8 - 1)) <
+                                   wr_ptr))
+        with m.If(rd_partial):
+            m.d.comb += rd_bank.eq(fill_bank)
+        with m.Else():
+            m.d.comb += rd_bank.eq(rd_hit[1])
 
         # Hook up unconditional interface logic first.
         # RAND
-        m.d.comb += self.rand.data.eq(self.buf[rd_ptr])
-        m.d.sync += rd_ptr.eq(self.rand.addr)
+        m.d.comb += self.rand.data.eq(Mux(
+            rd_uniform,
+            Cat(rd_value for _ in range(self.width // 8)),
+            self.buf[rd_bank].as_value().word_select(
+                rd_ptr[log2_int(self.width // 8):], self.width)))
+        m.d.sync += [
+            rd_ptr.eq(self.rand.addr),
+            rd_page.eq(req_page),
+            rd_uniform.eq(req_uniform),
+            rd_value.eq(req_value)
+        ]
         # Reads are registered, so it takes one cycle before
         # they're actually valid.
         m.d.sync += read_en_delayed.eq(self.rand.read_en)
+        m.d.comb += self.rand.valid.eq(read_en_delayed &
+                                       (rd_hit.any() | rd_partial |
+                                        rd_uniform))
+
+        with m.If(self.rand.valid):
+            m.d.sync += [
+                cur_page.eq(rd_page),
+                cur_valid.eq(1)
+            ]
+            # Uniform reads leave both banks alone.
+            with m.If(~rd_uniform):
+                m.d.sync += mru.eq(rd_bank)
+            with m.If(cur_valid & (rd_page != cur_page)):
+                m.d.sync += [
+                    prev_page.eq(cur_page),
+                    prev_valid.eq(1)
+                ]
 
         # SEQ
-        m.d.comb += self.seq.addr.eq(curr_page)
+        m.d.comb += self.seq.addr.eq(fill_page)
         m.d.sync += self.seq.stb.eq(0)
 
+        m.d.comb += demand_miss.eq(self.rand.read_en & ~req_hit.any() &
+                                   ~req_uniform)
+
+        if self.prefetch == Prefetch.NEXT_PAGE:
+            m.d.comb += next_page.eq(cur_page + 1)
+            m.d.comb += predictable.eq(cur_valid)
+        elif self.prefetch == Prefetch.STRIDE:
+            m.d.comb += next_page.eq(2 * cur_page - prev_page)
+            m.d.comb += predictable.eq(cur_valid & prev_valid)
+
+        if self.prefetch != Prefetch.OFF:
+            (next_uniform, _) = uniform(next_page, "next")
+            m.d.comb += do_prefetch.eq(
+                predictable & (next_page >= 0) &
+                (next_page <= self.max_page) & (next_page != cur_page) &
+                ~next_uniform &
+                ~((tag_valid[0] & (tags[0] == next_page)) |
+                  (tag_valid[1] & (tags[1] == next_page))))
+
+        def start_fill(page):
+            m.d.sync += [
+                fill_page.eq(page),
+                fill_bank.eq(~mru),
+                tag_valid.bit_select(~mru, 1).eq(0),
+                tags[~mru].eq(page),
+                self.seq.stb.eq(1),
+            ]
+            m.next = "FILL"
+
         with m.FSM() as fsm:
-            with m.State("INIT"):
-                with m.If(self.rand.read_en):
-                    m.d.sync += [
-                        curr_page.eq(self.rand.addr[4:]),
-                        self.seq.stb.eq(1),
-                    ]
-                    m.next = "FILL"
+            m.d.comb += filling.eq(fsm.ongoing("FILL"))
+
+            with m.State("IDLE"):
+                with m.If(demand_miss):
+                    start_fill(req_page)
+                with m.Elif(do_prefetch):
+                    start_fill(next_page)
 
             with m.State("FILL"):
                 with m.If(self.seq.ack):
                     m.d.sync += [
-                        self.buf[wr_ptr].eq(self.seq.data),
+                        self.buf[fill_bank][wr_ptr].eq(self.seq.data),
                         wr_ptr.eq(wr_ptr + 1),
-                        self.seq.stb.eq(1)
                     ]
 
+                    # Don't ask for a byte past the end of the page; the
+                    # streamer would take it as a request for a new page.
                     with m.If(wr_ptr == 15):
-                        m.next = "VALID"
-
-            with m.State("VALID"):
-                with m.If(self.rand.read_en):
-                    with m.If(self.rand.addr[4:] != curr_page):
-                        m.d.sync += [
-                            curr_page.eq(self.rand.addr[4:]),
-                            self.seq.stb.eq(1),
-                        ]
-
-                        m.next = "FILL"
-
-            m.d.comb += self.rand.valid.eq(read_en_delayed & fsm.ongoing("VALID"))  # noqa: E501
+                        m.d.sync += tag_valid.bit_select(fill_bank, 1).eq(1)
+                        m.next = "IDLE"
+                    with m.Else():
+                        m.d.sync += self.seq.stb.eq(1)
 
         return m
 
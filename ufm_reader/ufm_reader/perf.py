@@ -0,0 +1,69 @@
+from amaranth import Signal, Module, Array
+from amaranth.lib.enum import IntEnum
+from amaranth.lib.wiring import Signature, In, Out, Component
+
+
+# Register numbers of each counter.
+class Counter(IntEnum):
+    PAGE_MISSES = 0
+    BYTES = 1
+    IDLE_CYCLES = 2
+    SETUP_CYCLES = 3
+    DATA_CYCLES = 4
+    BUSY_CYCLES = 5
+    POLL_RETRIES = 6
+    WB_WAIT_CYCLES = 7
+
+
+# Which phase the Streamer is in, plus events, one cycle at a time.
+StreamerPerfSignature = Signature({
+    "idle": Out(1),  # Nothing to do (including an open session).
+    "setup": Out(1),  # Entering/leaving config mode, status, address.
+    "data": Out(1),  # READ_UFM, PROGRAM_UFM or ERASE_UFM.
+    "busy": Out(1),  # Waiting for the UFM to stop being busy.
+    "poll_retry": Out(1),  # A status/busy check found the UFM busy.
+    "wb_wait": Out(1),  # Wishbone stb waiting for ack.
+})
+
+# Counter read port. data is the counter selected by addr on the previous
+# cycle. clear zeroes all counters.
+PerfRegSignature = Signature({
+    "addr": Out(3),
+    "data": In(32),
+    "clear": Out(1),
+})
+
+
+# A bank of 32-bit counters, one per Counter, read through regs. Counts
+# wrap around.
+class PerfCounters(Component):
+    streamer: In(StreamerPerfSignature)
+    page_miss: In(1)
+    num_bytes: In(3)  # Bytes delivered this cycle.
+    regs: In(PerfRegSignature)
+
+    def elaborate(self, plat):
+        m = Module()
+
+        counters = Array(Signal(32, name=c.name.lower()) for c in Counter)
+
+        incs = {
+            Counter.PAGE_MISSES: self.page_miss,
+            Counter.BYTES: self.num_bytes,
+            Counter.IDLE_CYCLES: self.streamer.idle,
+            Counter.SETUP_CYCLES: self.streamer.setup,
+            Counter.DATA_CYCLES: self.streamer.data,
+            Counter.BUSY_CYCLES: self.streamer.busy,
+            Counter.POLL_RETRIES: self.streamer.poll_retry,
+            Counter.WB_WAIT_CYCLES: self.streamer.wb_wait,
+        }
+
+        for c, inc in incs.items():
+            with m.If(self.regs.clear):
+                m.d.sync += counters[c].eq(0)
+            with m.Else():
+                m.d.sync += counters[c].eq(counters[c] + inc)
+
+        m.d.sync += self.regs.data.eq(counters[self.regs.addr])
+
+        return m
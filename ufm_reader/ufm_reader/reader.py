@@ -1,51 +1,154 @@
-from amaranth import Signal, Module
+from amaranth import Signal, Module, Mux
+from amaranth.lib.fifo import SyncFIFOBuffered
 from amaranth.lib.wiring import Signature, In, Out, Component, connect, \
     flipped
 
-from .page_buffer import PageBuffer
+from .cache import Cache
+from .decompress import Decompressor
+from .page_buffer import PageBuffer, Prefetch
+from .perf import PerfCounters, PerfRegSignature
 from .streamer import Streamer
 from .sequencer import EfbWishbone
 
 
-ReaderSignature = Signature({
-    "data": In(8),
+# Same conventions for data widths above 8 as RandSignature.
+def reader_bus_signature(width=8):
+    return Signature({
+        "data": In(width),
+        "addr": Out(15),
+        "read_en": Out(1),
+        "valid": In(1),
+        "stall": Out(1),  # Unused, for compatibility with Verilog ports.
+    })
+
+
+ReaderSignature = reader_bus_signature()
+
+
+# Start address and length of a streamed read.
+ReaderCmdSignature = Signature({
     "addr": Out(15),
-    "read_en": Out(1),
-    "valid": In(1),
-    "stall": Out(1),  # Unused, for compatibility with Verilog ports.
+    "len": Out(15),
+    "valid": Out(1),
+    "ready": In(1)
 })
 
 
+# Ready/valid byte stream; a byte is transferred when both are asserted.
+ByteStreamSignature = Signature({
+    "data": Out(8),
+    "valid": Out(1),
+    "ready": In(1)
+})
+
+
+def reader_signature(stream, width=8, perf=False):
+    members = {
+        "bus": In(reader_bus_signature(width)),
+        "efb": Out(EfbWishbone),
+    }
+
+    if stream:
+        members.update({
+            "cmd": In(ReaderCmdSignature),
+            "src": Out(ByteStreamSignature),
+        })
+
+    if perf:
+        members["perf"] = In(PerfRegSignature)
+
+    return Signature(members)
+
+
+# If cache is not None, it's a dictionary of arguments to Cache, which
+# replaces the PageBuffer (and its prefetch options). The Cache gets its
+# width from width, so cache mustn't have one.
+#
+# If stream is True, Reader also has a cmd port taking a start address and
+# length, and a src port that streams the bytes out. Streamed reads bypass
+# the page buffer and are done as a single multi-page READ_UFM, which is
+# held off (via the Streamer's stall) while src is not being drained.
+#
+# width sets the width of bus.data (8, 16, or 32); src is always 8 bits.
+#
+# If perf is True, Reader has a bank of PerfCounters, read through the perf
+# port. A page miss is a bus read that isn't valid on the first cycle it
+# could be; bytes count both bus reads and bytes taken from src.
+#
+# If decompress is not None, it's a dictionary of arguments to
+# Decompressor, and the UFM holds an image compressed by image.compress.
+# Bus addresses are then into the uncompressed image, and prefetches stay
+# within it. Compressed images can't be streamed.
+#
+# uniform is passed through to the PageBuffer, so that pages known to hold
+# a single value are read without going to the UFM. It can't be used along
+# with cache, or with decompress (whose pages aren't the UFM's).
 class Reader(Component):
-    bus: In(ReaderSignature)
-    efb: Out(EfbWishbone)
+    def __init__(self, *, session_timeout=None, pipelined=False,
+                 prefetch=Prefetch.OFF, max_page=2047, cache=None,
+                 stream=False, width=8, perf=False, decompress=None,
+                 uniform=()):
+        if stream and decompress is not None:
+            raise ValueError("Streamed reads of a compressed image are not supported.")  # noqa: E501
+        if cache is not None and "width" in cache:
+            raise ValueError("Set the Cache's width with Reader's width, not in cache.")  # noqa: E501
+        if cache is not None and uniform:
+            raise ValueError("A uniform page map needs the PageBuffer, not a Cache.")  # noqa: E501
+        if decompress is not None and uniform:
+            raise ValueError("A uniform page map can't be used with a compressed image.")  # noqa: E501
 
-    def __init__(self):
-        super().__init__()
-        self.pagemod = PageBuffer()
-        self.streammod = Streamer()
+        self.stream = stream
+        self.width = width
+        self.perf_en = perf
+        super().__init__(reader_signature(stream, width, perf))
+        if decompress is not None:
+            self.decompmod = Decompressor(**decompress)
+            max_page = min(max_page, self.decompmod.num_pages - 1)
+        else:
+            self.decompmod = None
+        if cache is not None:
+            self.pagemod = Cache(width=width, **cache)
+        else:
+            self.pagemod = PageBuffer(prefetch=prefetch, max_page=max_page,
+                                      width=width, uniform=uniform)
+        self.streammod = Streamer(session_timeout=session_timeout,
+                                  pipelined=pipelined, perf=perf)
 
     def elaborate(self, plat):
         m = Module()
         m.submodules.pagemod = self.pagemod
         m.submodules.streammod = self.streammod
 
-        reader_ready = Signal(1)  # Presently unused, meant to support
-        # double-bufferring down the line. Right now, reader is inactive
-        # if read_en is not asserted.
+        reader_ready = Signal(1)  # Presently unused. The page buffer
+        # only ever has one fill outstanding, and prefetches on its own
+        # when read_en is not asserted.
 
         connect(m, flipped(self.efb), self.streammod.efb)
 
-        # connect(m, self.streammod.stream, self.pagemod.seq) if stall or ready
-        # were not part of stream signature.
-        m.d.comb += [
-            self.pagemod.seq.data.eq(self.streammod.stream.data),
-            self.streammod.stream.addr.eq(self.pagemod.seq.addr),
-            self.streammod.stream.stb.eq(self.pagemod.seq.stb),
-            self.pagemod.seq.ack.eq(self.streammod.stream.ack),
-            self.streammod.stream.stall.eq(0),
-            reader_ready.eq(self.streammod.stream.ready)
-        ]
+        m.d.comb += reader_ready.eq(self.streammod.stream.ready)
+
+        if self.decompmod is not None:
+            m.submodules.decompmod = self.decompmod
+            connect(m, self.pagemod.seq, self.decompmod.seq)
+            connect(m, self.decompmod.stream, self.streammod.stream)
+        elif self.stream:
+            m.d.comb += [
+                self.pagemod.seq.data.eq(self.streammod.stream.data),
+                self.streammod.stream.release.eq(0),
+            ]
+            self.elaborate_stream(m)
+        else:
+            # connect(m, self.streammod.stream, self.pagemod.seq) if stall
+            # or ready were not part of stream signature.
+            m.d.comb += [
+                self.pagemod.seq.data.eq(self.streammod.stream.data),
+                self.streammod.stream.release.eq(0),
+                self.streammod.stream.addr.eq(self.pagemod.seq.addr),
+                self.streammod.stream.stb.eq(self.pagemod.seq.stb),
+                self.pagemod.seq.ack.eq(self.streammod.stream.ack),
+                self.streammod.stream.stall.eq(0),
+                self.streammod.stream.pages.eq(1),
+            ]
 
         # "connect(m, flipped(self.pagemod.rand), self.bus)" if stall was not
         # part of bus signature, and flush was.
@@ -57,8 +160,148 @@ class Reader(Component):
             self.bus.valid.eq(self.pagemod.rand.valid),
         ]
 
+        if self.perf_en:
+            self.elaborate_perf(m)
+
         return m
 
+    def elaborate_perf(self, m):
+        m.submodules.perf = perf = PerfCounters()
+
+        connect(m, flipped(self.perf), perf.regs)
+        connect(m, self.streammod.perf, perf.streamer)
+
+        # A read has been waiting since the previous cycle; count it once.
+        waiting = Signal(1)
+        counted = Signal(1)
+        last_valid = Signal(1)
+        last_addr = Signal.like(self.bus.addr)
+        word_bytes = self.width // 8
+
+        m.d.sync += waiting.eq(self.bus.read_en)
+        with m.If(~self.bus.read_en | self.bus.valid):
+            m.d.sync += counted.eq(0)
+        with m.Elif(waiting & ~counted):
+            m.d.comb += perf.page_miss.eq(1)
+            m.d.sync += counted.eq(1)
+
+        # valid stays up while the same address is held.
+        m.d.sync += [
+            last_valid.eq(self.bus.valid),
+            last_addr.eq(self.bus.addr)
+        ]
+        new_read = Signal(1)
+        m.d.comb += new_read.eq(self.bus.valid & self.bus.read_en &
+                                ~(last_valid & (last_addr == self.bus.addr)))
+
+        if self.stream:
+            m.d.comb += perf.num_bytes.eq(
+                Mux(new_read, word_bytes, 0) +
+                (self.src.valid & self.src.ready))
+        else:
+            m.d.comb += perf.num_bytes.eq(Mux(new_read, word_bytes, 0))
+
+    # Share the Streamer between the page buffer and streamed reads. Whoever
+    # starts a request first owns the Streamer until all of its bytes have
+    # been acked; a page buffer request that comes in the meantime is held.
+    def elaborate_stream(self, m):
+        stream = self.streammod.stream
+        pageseq = self.pagemod.seq
+
+        m.submodules.fifo = fifo = SyncFIFOBuffered(width=8, depth=4)
+
+        page_pending = Signal(1)
+        # The Streamer may only act on a request later, so hold these.
+        stream_page = Signal.like(stream.addr)
+        stream_pages = Signal.like(stream.pages)
+        acks_left = Signal(16 + 4)
+        skip = Signal(4)
+        to_send = Signal.like(self.cmd.len)
+
+        m.d.comb += [
+            self.src.data.eq(fifo.r_data),
+            self.src.valid.eq(fifo.r_rdy),
+            fifo.r_en.eq(self.src.ready),
+            fifo.w_data.eq(stream.data)
+        ]
+
+        with m.FSM():
+            with m.State("IDLE"):
+                m.d.comb += [
+                    stream.addr.eq(pageseq.addr),
+                    stream.pages.eq(1)
+                ]
+
+                with m.If(pageseq.stb | page_pending):
+                    m.d.comb += stream.stb.eq(1)
+                    m.d.sync += [
+                        page_pending.eq(0),
+                        acks_left.eq(16)
+                    ]
+                    m.next = "PAGE"
+                with m.Elif(self.cmd.valid & (self.cmd.len != 0)):
+                    m.d.comb += self.cmd.ready.eq(1)
+                    m.d.sync += [
+                        stream_page.eq(self.cmd.addr[4:]),
+                        stream_pages.eq((self.cmd.addr[:4] + self.cmd.len +
+                                         15)[4:]),
+                        acks_left.eq(((self.cmd.addr[:4] + self.cmd.len +
+                                       15)[4:]) * 16),
+                        skip.eq(self.cmd.addr[:4]),
+                        to_send.eq(self.cmd.len)
+                    ]
+                    m.next = "STREAM_START"
+                with m.Elif(self.cmd.valid):
+                    m.d.comb += self.cmd.ready.eq(1)
+
+            with m.State("PAGE"):
+                m.d.comb += [
+                    stream.addr.eq(pageseq.addr),
+                    stream.stb.eq(pageseq.stb),
+                    stream.pages.eq(1),
+                    pageseq.ack.eq(stream.ack)
+                ]
+
+                with m.If(stream.ack):
+                    m.d.sync += acks_left.eq(acks_left - 1)
+                    with m.If(acks_left == 1):
+                        m.next = "IDLE"
+
+            with m.State("STREAM_START"):
+                m.d.comb += [
+                    stream.addr.eq(stream_page),
+                    stream.pages.eq(stream_pages),
+                    stream.stb.eq(1)
+                ]
+
+                with m.If(pageseq.stb):
+                    m.d.sync += page_pending.eq(1)
+
+                m.next = "STREAM"
+
+            with m.State("STREAM"):
+                m.d.comb += [
+                    stream.addr.eq(stream_page),
+                    stream.pages.eq(stream_pages),
+                ]
+
+                # Leave room for a byte already in flight.
+                m.d.comb += stream.stall.eq(fifo.w_level >= fifo.depth - 2)
+
+                with m.If(pageseq.stb):
+                    m.d.sync += page_pending.eq(1)
+
+                with m.If(stream.ack):
+                    m.d.sync += acks_left.eq(acks_left - 1)
+                    with m.If(skip != 0):
+                        m.d.sync += skip.eq(skip - 1)
+                    with m.Elif(to_send != 0):
+                        m.d.comb += fifo.w_en.eq(1)
+                        m.d.sync += to_send.eq(to_send - 1)
+
+                    with m.If(acks_left == 1):
+                        m.next = "IDLE"
+
 
 if __name__ == "__main__":
     m = Reader()
@@ -1,7 +1,8 @@
 from amaranth import Signal, Module, unsigned
 from amaranth.lib.data import ArrayLayout, Struct, Union, View
 from amaranth.lib.enum import IntEnum
-from amaranth.lib.wiring import Signature, In, Out, Component
+from amaranth.lib.wiring import Signature, In, Out, Component, flipped, \
+    connect
 
 
 class Name(IntEnum):
@@ -10,6 +11,9 @@ class Name(IntEnum):
     POLL_STATUS = 0x3C
     SET_UFM_ADDR = 0xB4
     READ_UFM = 0xCA
+    ERASE_UFM = 0xCB
+    PROGRAM_UFM = 0xC9
+    CHECK_BUSY = 0xF0
     DISABLE_CONFIG = 0x26
     BYPASS = 0xFF
 
@@ -58,9 +62,15 @@ class StatusRegisterByte(Struct):
     _2: unsigned(2)
 
 
+class BusyFlagByte(Struct):
+    _1: unsigned(7)
+    busy: unsigned(1)
+
+
 class ReadData(Union):
     stream: unsigned(8)
     status: StatusRegisterByte
+    busy_flag: BusyFlagByte
 
 
 class SysConfigCmd(Struct):
@@ -68,16 +78,38 @@ class SysConfigCmd(Struct):
     ops: Operands
 
 
-# Currently ready/valid unused. It'll be used to write to UFM.
+# How each command is framed: operands, operand bytes, data bytes and
+# whether the data is written. None is filled in per request by whoever
+# issues the command. Adding a command only needs an entry here (and in
+# Name).
+COMMANDS = {
+    Name.IDLE: (0, 0, 0, 1),
+    Name.ENABLE_CONFIG: (ConstantOp.ENABLE, 3, 0, 1),
+    Name.POLL_STATUS: (0, 3, 4, 0),
+    Name.SET_UFM_ADDR: (0, 3, 4, 1),
+    Name.READ_UFM: (None, 3, None, 0),
+    Name.ERASE_UFM: (0, 3, 0, 1),
+    Name.PROGRAM_UFM: (ConstantOp.ONE, 3, 16, 1),
+    Name.CHECK_BUSY: (0, 3, 1, 0),
+    Name.DISABLE_CONFIG: (0, 2, 0, 1),
+    Name.BYPASS: (0, 0, 0, 1),
+}
+
+
+# ready/valid only apply to streamed writes (data_len > 4); ready is
+# asserted for each byte as the EFB takes it.
 SeqWriteStreamSignature = Signature({
     "data": Out(WriteData),
     "ready": In(1),
     "valid": Out(1)
 })
 
+# Deasserting ready holds off the next data read; a read already in flight
+# still completes.
 SeqReadStreamSignature = Signature({
     "data": Out(ReadData),
-    "stb": Out(1)
+    "stb": Out(1),
+    "ready": In(1, reset=1)
 })
 
 SequencerSignature = Signature({
@@ -85,7 +117,7 @@ SequencerSignature = Signature({
     "cmd": Out(SysConfigCmd),
     "done": In(1),
     "op_len": Out(2),  # Temporary, for compatibility with Verilog ports.  # noqa: E501
-    "data_len": Out(6),  # Temporary, for compatibility with Verilog ports.  # noqa: E501
+    "data_len": Out(20),  # Temporary, for compatibility with Verilog ports.  # noqa: E501
     "xfer_is_wr": Out(1),  # Temporary, for compatibility with Verilog ports.  # noqa: E501
     "wr": Out(SeqWriteStreamSignature),
     "rd": In(SeqReadStreamSignature)
@@ -103,17 +135,26 @@ EfbWishbone = Signature({
 })
 
 
+# In pipelined mode, cyc/stb stay asserted across consecutive bytes of a
+# transaction; the next byte goes out on the cycle after the EFB acks the
+# previous one, instead of going through an idle *_2 state first. rd.stb is
+# registered in this mode, one cycle after the ack that latched rd.data.
 class Sequencer(Component):
     ctl: In(SequencerSignature)
     efb: Out(EfbWishbone)
 
-    def __init__(self):
+    def __init__(self, *, pipelined=False):
         super().__init__()
+        self.pipelined = pipelined
 
     def elaborate(self, plat):
         m = Module()
         curr_op = Signal(2)
-        curr_data = Signal(6)
+        curr_data = Signal(20)
+        rd_stb = Signal(1)
+        rd_busy = Signal(1)
+        wr_busy = Signal(1)
+        wr_stream = Signal(1)
 
         def next_state_if_asserted(stim, state):
             with m.If(stim):
@@ -148,17 +189,60 @@ class Sequencer(Component):
         def wb_data_slice_data():
             data_view = View(ArrayLayout(8, 4), self.ctl.wr.data)
 
-            with m.Switch(curr_data):
-                with m.Case(0):
-                    m.d.comb += self.efb.dat_w.eq(data_view[3])
-                with m.Case(1):
-                    m.d.comb += self.efb.dat_w.eq(data_view[2])
-                with m.Case(2):
-                    m.d.comb += self.efb.dat_w.eq(data_view[1])
-                with m.Case(3):
-                    m.d.comb += self.efb.dat_w.eq(data_view[0])
-                with m.Default():
-                    pass
+            with m.If(wr_stream):
+                m.d.comb += self.efb.dat_w.eq(self.ctl.wr.data.stream)
+            with m.Else():
+                with m.Switch(curr_data):
+                    with m.Case(0):
+                        m.d.comb += self.efb.dat_w.eq(data_view[3])
+                    with m.Case(1):
+                        m.d.comb += self.efb.dat_w.eq(data_view[2])
+                    with m.Case(2):
+                        m.d.comb += self.efb.dat_w.eq(data_view[1])
+                    with m.Case(3):
+                        m.d.comb += self.efb.dat_w.eq(data_view[0])
+                    with m.Default():
+                        pass
+
+        # Decide what follows the last ack, shared between the *_2 states
+        # and (in pipelined mode) the *_1 states.
+        def after_cmd():
+            with m.If(self.ctl.op_len > 0):
+                m.next = "WB_OPERAND_1"
+            with m.Elif(self.ctl.data_len > 0):
+                m.next = "WB_DATA_1"
+            with m.Else():
+                m.next = "WB_DISABLE_1"
+
+        def after_operand():
+            with m.If(curr_op < self.ctl.op_len - 1):
+                m.d.sync += curr_op.eq(curr_op + 1)
+            with m.Else():
+                m.d.sync += curr_op.eq(0)
+
+            with m.If(curr_op < self.ctl.op_len - 1):
+                m.next = "WB_OPERAND_1"
+            with m.Elif(self.ctl.data_len > 0):
+                m.next = "WB_DATA_1"
+            with m.Else():
+                m.next = "WB_DISABLE_1"
+
+        def after_data():
+            with m.If(curr_data < self.ctl.data_len - 1):
+                m.d.sync += curr_data.eq(curr_data + 1)
+            with m.Else():
+                m.d.sync += curr_data.eq(0)
+
+            with m.If(curr_data < self.ctl.data_len - 1):
+                m.next = "WB_DATA_1"
+            with m.Else():
+                m.next = "WB_DISABLE_1"
+
+        m.d.comb += wr_stream.eq(self.ctl.data_len > 4)
+
+        if self.pipelined:
+            m.d.sync += rd_stb.eq(0)
+            m.d.comb += self.ctl.rd.stb.eq(rd_stb)
 
         with m.FSM() as fsm:  # noqa: F841
             with m.State("IDLE"):
@@ -171,12 +255,16 @@ class Sequencer(Component):
                     self.efb.adr.eq(0x70)
                 ]
 
-                next_state_if_asserted(self.efb.ack, "WB_ENABLE_2")
+                if self.pipelined:
+                    next_state_if_asserted(self.efb.ack, "WB_CMD_1")
+                else:
+                    next_state_if_asserted(self.efb.ack, "WB_ENABLE_2")
 
-            with m.State("WB_ENABLE_2"):
-                m.d.comb += self.efb.adr.eq(0x70)
+            if not self.pipelined:
+                with m.State("WB_ENABLE_2"):
+                    m.d.comb += self.efb.adr.eq(0x70)
 
-                m.next = "WB_CMD_1"
+                    m.next = "WB_CMD_1"
 
             with m.State("WB_CMD_1"):
                 wb_write()
@@ -185,75 +273,78 @@ class Sequencer(Component):
                     self.efb.adr.eq(0x71)
                 ]
 
-                next_state_if_asserted(self.efb.ack, "WB_CMD_2")
+                if self.pipelined:
+                    with m.If(self.efb.ack):
+                        after_cmd()
+                else:
+                    next_state_if_asserted(self.efb.ack, "WB_CMD_2")
 
-            with m.State("WB_CMD_2"):
-                m.d.comb += [
-                    self.efb.dat_w.eq(self.ctl.cmd),
-                    self.efb.adr.eq(0x71)
-                ]
+            if not self.pipelined:
+                with m.State("WB_CMD_2"):
+                    m.d.comb += [
+                        self.efb.dat_w.eq(self.ctl.cmd),
+                        self.efb.adr.eq(0x71)
+                    ]
 
-                with m.If(self.ctl.op_len > 0):
-                    m.next = "WB_OPERAND_1"
-                with m.Elif(self.ctl.data_len > 0):
-                    m.next = "WB_DATA_1"
-                with m.Else():
-                    m.next = "WB_DISABLE_1"
+                    after_cmd()
 
             with m.State("WB_OPERAND_1"):
                 wb_write()
                 wb_data_slice_ops()
                 m.d.comb += self.efb.adr.eq(0x71)
 
-                next_state_if_asserted(self.efb.ack, "WB_OPERAND_2")
-
-            with m.State("WB_OPERAND_2"):
-                wb_data_slice_ops()
-                m.d.comb += self.efb.adr.eq(0x71)
+                if self.pipelined:
+                    with m.If(self.efb.ack):
+                        after_operand()
+                else:
+                    next_state_if_asserted(self.efb.ack, "WB_OPERAND_2")
 
-                with m.If(curr_op < self.ctl.op_len - 1):
-                    m.d.sync += curr_op.eq(curr_op + 1)
-                with m.Else():
-                    m.d.sync += curr_op.eq(0)
+            if not self.pipelined:
+                with m.State("WB_OPERAND_2"):
+                    wb_data_slice_ops()
+                    m.d.comb += self.efb.adr.eq(0x71)
 
-                with m.If(curr_op < self.ctl.op_len - 1):
-                    m.next = "WB_OPERAND_1"
-                with m.Elif(self.ctl.data_len > 0):
-                    m.next = "WB_DATA_1"
-                with m.Else():
-                    m.next = "WB_DISABLE_1"
+                    after_operand()
 
             with m.State("WB_DATA_1"):
                 wb_data_slice_data()
-                with m.If(self.ctl.xfer_is_wr):
+                with m.If(self.ctl.xfer_is_wr & wr_stream):
+                    m.d.comb += self.efb.adr.eq(0x71)
+                    with m.If(self.ctl.wr.valid | wr_busy):
+                        wb_write()
+                        m.d.sync += wr_busy.eq(~self.efb.ack)
+                        m.d.comb += self.ctl.wr.ready.eq(self.efb.ack)
+                with m.Elif(self.ctl.xfer_is_wr):
                     wb_write()
                     m.d.comb += self.efb.adr.eq(0x71)
-                with m.Else():
+                with m.Elif(self.ctl.rd.ready | rd_busy):
                     wb_read()
                     m.d.comb += self.efb.adr.eq(0x73)
+                    # Once stb is up, it has to stay up until the ack.
+                    m.d.sync += rd_busy.eq(~self.efb.ack)
+                with m.Else():
+                    m.d.comb += self.efb.adr.eq(0x73)
 
                 with m.If(self.efb.ack):
                     m.d.sync += self.ctl.rd.data.eq(self.efb.dat_r)
 
-                next_state_if_asserted(self.efb.ack, "WB_DATA_2")
+                if self.pipelined:
+                    with m.If(self.efb.ack):
+                        m.d.sync += rd_stb.eq(1)
+                        after_data()
+                else:
+                    next_state_if_asserted(self.efb.ack, "WB_DATA_2")
 
-            with m.State("WB_DATA_2"):
-                wb_data_slice_data()
-                with m.If(self.ctl.xfer_is_wr):
-                    m.d.comb += self.efb.adr.eq(0x71)
-                with m.Else():
-                    m.d.comb += self.efb.adr.eq(0x73)
-                m.d.comb += self.ctl.rd.stb.eq(1)
+            if not self.pipelined:
+                with m.State("WB_DATA_2"):
+                    wb_data_slice_data()
+                    with m.If(self.ctl.xfer_is_wr):
+                        m.d.comb += self.efb.adr.eq(0x71)
+                    with m.Else():
+                        m.d.comb += self.efb.adr.eq(0x73)
+                    m.d.comb += self.ctl.rd.stb.eq(1)
 
-                with m.If(curr_data < self.ctl.data_len - 1):
-                    m.d.sync += curr_data.eq(curr_data + 1)
-                with m.Else():
-                    m.d.sync += curr_data.eq(0)
-
-                with m.If(curr_data < self.ctl.data_len - 1):
-                    m.next = "WB_DATA_1"
-                with m.Else():
-                    m.next = "WB_DISABLE_1"
+                    after_data()
 
             with m.State("WB_DISABLE_1"):
                 wb_write()
@@ -269,3 +360,47 @@ class Sequencer(Component):
                 next_state_if_asserted(self.ctl.req, "WB_ENABLE_1")
 
         return m
+
+
+# Same as SequencerSignature, minus the nested streams, which Wrapper
+# brings out to the top level.
+WrapperCtlSignature = Signature({
+    k: v for k, v in SequencerSignature.members.items()
+    if k not in ("wr", "rd")
+})
+
+
+# Flatten the Sequencer's nested ctl interface so that each stream gets
+# its own set of ports.
+class Wrapper(Component):
+    ctl: In(WrapperCtlSignature)
+    wr: In(SeqWriteStreamSignature)
+    rd: Out(SeqReadStreamSignature)
+    efb: Out(EfbWishbone)
+
+    def __init__(self, seq):
+        super().__init__()
+        self.seq = seq
+
+    def elaborate(self, plat):
+        m = Module()
+        m.submodules.seq = self.seq
+
+        connect(m, flipped(self.efb), self.seq.efb)
+
+        m.d.comb += [
+            self.seq.ctl.req.eq(self.ctl.req),
+            self.seq.ctl.cmd.eq(self.ctl.cmd),
+            self.ctl.done.eq(self.seq.ctl.done),
+            self.seq.ctl.op_len.eq(self.ctl.op_len),
+            self.seq.ctl.data_len.eq(self.ctl.data_len),
+            self.seq.ctl.xfer_is_wr.eq(self.ctl.xfer_is_wr),
+            self.seq.ctl.wr.data.eq(self.wr.data),
+            self.seq.ctl.wr.valid.eq(self.wr.valid),
+            self.wr.ready.eq(self.seq.ctl.wr.ready),
+            self.rd.data.eq(self.seq.ctl.rd.data),
+            self.rd.stb.eq(self.seq.ctl.rd.stb),
+            self.seq.ctl.rd.ready.eq(self.rd.ready),
+        ]
+
+        return m
@@ -0,0 +1,100 @@
+from amaranth import Signal, Module, Memory, Cat
+from amaranth.lib.wiring import Signature, In, Out, Component, connect, \
+    flipped
+from amaranth.utils import log2_int
+
+from .efb import EBR_BLOCKS, UFM_END_PAGE
+from .image import PAGE_SIZE
+from .page_buffer import rand_signature
+from .sequencer import EfbWishbone
+from .streamer import Op, Streamer
+
+
+# Largest region that fits in both the UFM and the EBR of a device, in
+# pages.
+def max_shadow_pages(dev_density):
+    return min(UFM_END_PAGE[dev_density] + 1,
+               EBR_BLOCKS[dev_density] * 1024 // PAGE_SIZE)
+
+
+# Copies num_pages pages of the UFM, from start_page on, into block RAM
+# after reset, then serves reads from there. ready is low while the copy
+# runs. The copy is a single READ_UFM for the whole region, pipelined by
+# default; dummy_bytes is passed through to the Streamer.
+#
+# rand works like the PageBuffer's, with UFM byte addresses. Once ready is
+# high, every read is valid the cycle after read_en, like a page buffer
+# hit. Reads from outside the region return garbage. flush is ignored.
+class Shadow(Component):
+    def __init__(self, *, start_page, num_pages, width=8, pipelined=True,
+                 dummy_bytes=0):
+        if num_pages < 1:
+            raise ValueError("Shadowed region must be at least one page.")
+        if start_page + num_pages > 2048:
+            raise ValueError("Shadowed region goes past the end of the UFM.")  # noqa: E501
+
+        super().__init__(Signature({
+            "rand": In(rand_signature(width)),
+            "ready": Out(1),
+            "efb": Out(EfbWishbone)
+        }))
+        self.start_page = start_page
+        self.num_pages = num_pages
+        self.width = width
+        self.mem = Memory(width=width,
+                          depth=num_pages * PAGE_SIZE // (width // 8))
+        self.streammod = Streamer(pages=num_pages, pipelined=pipelined,
+                                  dummy_bytes=dummy_bytes)
+
+    def elaborate(self, plat):
+        m = Module()
+        m.submodules.streammod = self.streammod
+        m.submodules.rd = rd = self.mem.read_port()
+        m.submodules.wr = wr = self.mem.write_port(granularity=8)
+
+        stream = self.streammod.stream
+        lane_bits = log2_int(self.width // 8)
+        num_bytes = self.num_pages * PAGE_SIZE
+        wr_ptr = Signal(range(num_bytes))
+        read_en_delayed = Signal(1)
+
+        connect(m, flipped(self.efb), self.streammod.efb)
+
+        # Copy
+        m.d.comb += [
+            stream.addr.eq(self.start_page),
+            stream.pages.eq(self.num_pages),
+            stream.op.eq(Op.READ),
+            wr.addr.eq(wr_ptr[lane_bits:]),
+            wr.data.eq(Cat(stream.data for _ in range(self.width // 8)))
+        ]
+
+        with m.FSM():
+            with m.State("START"):
+                m.d.comb += stream.stb.eq(1)
+                m.next = "COPY"
+
+            # The Streamer acks every byte of the region without further
+            # strobes.
+            with m.State("COPY"):
+                with m.If(stream.ack):
+                    for i in range(self.width // 8):
+                        m.d.comb += wr.en[i].eq(wr_ptr[:lane_bits] == i)
+                    m.d.sync += wr_ptr.eq(wr_ptr + 1)
+
+                    with m.If(wr_ptr == num_bytes - 1):
+                        m.next = "READY"
+
+            with m.State("READY"):
+                m.d.comb += self.ready.eq(1)
+
+        # Serve
+        m.d.comb += [
+            rd.addr.eq((self.rand.addr - self.start_page * PAGE_SIZE)
+                       [lane_bits:]),
+            self.rand.data.eq(rd.data)
+        ]
+        m.d.sync += read_en_delayed.eq(self.rand.read_en)
+        m.d.comb += self.rand.valid.eq(read_en_delayed & self.ready)
+
+        return m
@@ -0,0 +1,151 @@
+from amaranth.sim import Passive
+
+from .sequencer import Name
+
+
+# Read a UFM initialization file in the format Diamond takes for
+# UFM_INIT_FILE_NAME: one 16-byte page per line, in hex.
+def load_mem(filename):
+    pages = []
+    with open(filename) as fp:
+        for line in fp:
+            line = line.strip()
+            if line:
+                pages.append(list(bytes.fromhex(line)))
+
+    return pages
+
+
+# Transaction-level model of the EFB's Wishbone config interface and the
+# UFM behind it, for simulating anything with an EfbWishbone port. Add
+# process as a sync process:
+#
+#     efb = EfbModel(reader.efb, init_mem="data/init.mem", start_page=2042)
+#     sim.add_sync_process(efb.process)
+#
+# ENABLE_CONFIG, POLL_STATUS, SET_UFM_ADDR, READ_UFM, ERASE_UFM,
+# PROGRAM_UFM, CHECK_BUSY, DISABLE_CONFIG and BYPASS are implemented; every
+# command is appended to log. Commands take effect when the frame is
+# closed, like on the real EFB.
+#
+# ufm maps page numbers to lists of 16 bytes. Pages not in it read back as
+# fill(byte address) if fill is given, and as 0 (erased) otherwise. As on
+# the device, the UFM address increments after each page read or
+# programmed, and READ_UFM returns dummy_bytes bytes of padding between
+# pages.
+#
+# Each Wishbone access is acked ack_latency cycles after stb is seen, with
+# at least one idle cycle between acks. Erase and program keep the UFM busy
+# for busy_cycles cycles; irq is pulsed in the last of them.
+class EfbModel:
+    def __init__(self, efb, *, init_mem=None, start_page=0, fill=None,
+                 ack_latency=1, busy_cycles=0, dummy_bytes=0):
+        self.efb = efb
+        self.fill = fill
+        self.ack_latency = ack_latency
+        self.busy_cycles = busy_cycles
+        self.dummy_bytes = dummy_bytes
+
+        self.ufm = {}
+        if init_mem is not None:
+            for i, page in enumerate(load_mem(init_mem)):
+                self.ufm[start_page + i] = page
+
+        self.log = []
+        self.page = 0
+        self.busy = 0
+
+        self._cmd = None
+        self._ops = []
+        self._pos = 0
+
+    def read_byte(self, page, offset):
+        if page in self.ufm:
+            return self.ufm[page][offset]
+        elif self.fill is not None:
+            return self.fill(page * 16 + offset) & 0xff
+        else:
+            return 0
+
+    def write(self, adr, data):
+        if adr == 0x70 and data & 0x80:
+            self._cmd = None
+            self._ops = []
+            self._pos = 0
+        elif adr == 0x70:
+            self.end_frame()
+        elif adr == 0x71 and self._cmd is None:
+            self._cmd = data
+            self.log.append(data)
+        elif adr == 0x71:
+            self._ops.append(data)
+
+    def end_frame(self):
+        if self._cmd == Name.SET_UFM_ADDR:
+            self.page = ((self._ops[5] << 8) | self._ops[6]) & 0x3fff
+        elif self._cmd == Name.PROGRAM_UFM:
+            self.ufm[self.page] = self._ops[3:19]
+            self.page += 1
+            self.busy = self.busy_cycles
+        elif self._cmd == Name.ERASE_UFM:
+            self.ufm = {}
+            self.fill = None
+            self.busy = self.busy_cycles
+
+        self._cmd = None
+
+    def read(self, adr):
+        if adr != 0x73:
+            return 0
+
+        pos = self._pos
+        self._pos += 1
+
+        if self._cmd == Name.READ_UFM:
+            # No padding in front of the first page.
+            if pos < 16:
+                offset = pos
+            else:
+                offset = (pos - 16) % (16 + self.dummy_bytes) - \
+                    self.dummy_bytes
+
+            if offset < 0:
+                return 0xEE
+
+            data = self.read_byte(self.page, offset)
+            if offset == 15:
+                self.page += 1
+            return data
+        elif self._cmd == Name.POLL_STATUS:
+            # Busy is bit 12 of the 32-bit status register, MSB first.
+            return 0x10 if (pos == 2 and self.busy) else 0
+        elif self._cmd == Name.CHECK_BUSY:
+            return 0x80 if self.busy else 0
+        else:
+            return 0
+
+    def process(self):
+        yield Passive()
+
+        waited = 0
+        while True:
+            yield self.efb.ack.eq(0)
+            yield self.efb.irq.eq(self.busy == 1)
+            self.busy = max(self.busy - 1, 0)
+
+            if (yield self.efb.stb) and (yield self.efb.cyc) and \
+                    not (yield self.efb.ack):
+                waited += 1
+                if waited >= self.ack_latency:
+                    waited = 0
+                    adr = yield self.efb.adr
+
+                    if (yield self.efb.we):
+                        self.write(adr, (yield self.efb.dat_w))
+                    else:
+                        yield self.efb.dat_r.eq(self.read(adr))
+
+                    yield self.efb.ack.eq(1)
+            else:
+                waited = 0
+            yield
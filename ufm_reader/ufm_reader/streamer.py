@@ -1,25 +1,113 @@
-from amaranth import Signal, Module
+from enum import Enum
+
+from amaranth import Signal, Module, Cat, unsigned
+from amaranth.lib.enum import IntEnum
 from amaranth.lib.wiring import Signature, In, Out, Component, connect, \
     flipped
 
 from .page_buffer import SeqSignature as PageBufSignature
-from .sequencer import SequencerSignature, EfbWishbone, Sequencer, Name
+from .perf import StreamerPerfSignature
+from .sequencer import SequencerSignature, EfbWishbone, Sequencer, Name, \
+    COMMANDS
+
+
+class Op(IntEnum, shape=unsigned(2)):
+    READ = 0
+    ERASE = 1
+    PROGRAM = 2
+
+
+# How to wait out a busy UFM (status or busy flag set).
+class BusyWait(Enum):
+    POLL = "poll"  # Check again straight away.
+    BACKOFF = "backoff"  # Wait, doubling the wait each time it's still busy.
+    IRQ = "irq"  # Wait for the EFB interrupt, or a timeout.
 
 
 StreamerSignature = Signature({
     **PageBufSignature.members,
-    "stall": Out(1),  # Unused, for compatibility with Verilog ports.  # noqa: E501
-    "ready": In(1),  # Unused, for compatibility with Verilog ports.  # noqa: E501
+    "stall": Out(1),  # Hold off READ_UFM data until deasserted.
+    "ready": In(1),  # Idle, or session open with nothing in progress.
+    "release": Out(1),  # Close an open session (see Streamer).
+    "pages": Out(12),  # Pages to read per request. 0 means use default.
+    "op": Out(Op),  # What a request does (see Streamer).
+    "wr_data": Out(8),  # Bytes to program, with a ready/valid handshake.
+    "wr_valid": Out(1),
+    "wr_ready": In(1),
 })
 
 
+# If session_timeout is None, every page read is wrapped in its own
+# ENABLE_CONFIG/DISABLE_CONFIG/BYPASS sequence. Otherwise, the config
+# interface stays enabled after a READ_UFM, and the next page only costs a
+# SET_UFM_ADDR/READ_UFM pair. The session is closed after session_timeout
+# idle cycles, or when stream.release is asserted.
+#
+# Each request reads stream.pages consecutive pages (or pages, if
+# stream.pages is 0) with a single READ_UFM. For multi-page reads, the EFB
+# returns dummy_bytes bytes of padding between pages; these are dropped
+# and not acked.
+#
+# stream.op selects what a request does; it is sampled along with
+# stream.stb:
+#
+# * Op.READ reads pages as above.
+# * Op.ERASE erases the whole UFM (the MachXO2 can't erase less).
+# * Op.PROGRAM programs stream.pages pages (or pages, if 0) starting at
+#   stream.addr, 16 bytes at a time from wr_data/wr_valid/wr_ready. All
+#   pages are programmed within the same config session, relying on the
+#   UFM address incrementing after each page.
+#
+# Erase and program wait for the UFM busy flag to clear afterwards; ready
+# goes high again once they have finished.
+#
+# busy_wait sets what happens when the UFM turns out to be busy. With
+# BusyWait.BACKOFF, the next check is backoff cycles later, doubling on
+# each further check up to max_backoff cycles (16 * backoff if None). With
+# BusyWait.IRQ, the next check happens when efb.irq (WBCUFMIRQ) is
+# asserted; the EFB must be set up to raise it. The interrupt is only
+# taken as a hint: the busy flag is always checked again, and max_backoff
+# cycles without an interrupt also count.
+#
+# If track_addr is True, the Streamer keeps track of the UFM address,
+# which the EFB increments after each page read or programmed, for as long
+# as the config interface stays enabled. A read of the page it already
+# points at skips SET_UFM_ADDR, so a sequential scan within a session only
+# costs a READ_UFM per request.
+#
+# The status register is only polled after ENABLE_CONFIG if the UFM may
+# still be busy: after reset, or after an erase or program that hasn't
+# been seen to finish. Otherwise, reads go straight to SET_UFM_ADDR. If
+# poll_status is True, it is polled after every ENABLE_CONFIG anyway.
+#
+# pipelined is passed through to the Sequencer.
+#
+# If perf is True, the perf port says what the Streamer is spending each
+# cycle on, for PerfCounters.
 class Streamer(Component):
-    stream: In(StreamerSignature)
-    efb: Out(EfbWishbone)
-
-    def __init__(self):
-        super().__init__()
-        self.seqmod = Sequencer()
+    def __init__(self, *, session_timeout=None, pages=1, dummy_bytes=0,
+                 pipelined=False, busy_wait=BusyWait.POLL, backoff=64,
+                 max_backoff=None, track_addr=True, poll_status=False,
+                 perf=False):
+        members = {
+            "stream": In(StreamerSignature),
+            "efb": Out(EfbWishbone),
+        }
+        if perf:
+            members["perf"] = Out(StreamerPerfSignature)
+
+        super().__init__(Signature(members))
+        self.perf_en = perf
+        self.session_timeout = session_timeout
+        self.pages = pages
+        self.dummy_bytes = dummy_bytes
+        self.track_addr = track_addr
+        self.poll_status = poll_status
+        self.busy_wait = BusyWait(busy_wait)
+        self.backoff = backoff
+        self.max_backoff = max_backoff if max_backoff is not None \
+            else 16 * backoff
+        self.seqmod = Sequencer(pipelined=pipelined)
         self._seq = SequencerSignature.create()
 
     def elaborate(self, plat):
@@ -28,149 +116,382 @@ class Streamer(Component):
 
         ufm_busy = Signal(2)
         just_entered = Signal(1)
+        curr_op = Signal(Op)
+        # Set from the first check that finds the UFM busy, until one finds
+        # it isn't.
+        retrying = Signal(1)
+        poll_retry = Signal(1)
+        # An erase or program may not have finished. We don't know what
+        # happened before reset.
+        busy_pending = Signal(1, reset=1)
+
+        # The page buffer strobes once per byte it wants. A strobe only
+        # starts a new read if it arrives after the current page has been
+        # handed over; remember it until we're ready to act on it.
+        stb_pending = Signal(1)
+        take_stb = Signal(1)
+        page_drained = Signal(1)
+        new_stb = Signal(1)
+        req = Signal(1)
+
+        burst_pages = Signal.like(self.stream.pages)
+        pages_left = Signal.like(self.stream.pages)
+        # Position within the current page, counting any dummy bytes in
+        # front of it.
+        page_cnt = Signal(range(16 + self.dummy_bytes))
+        in_dummy = Signal(1)
+
+        # Page the UFM address points at, if known.
+        ufm_addr = Signal.like(self.stream.addr)
+        ufm_addr_valid = Signal(1)
+
+        if self.session_timeout is not None:
+            idle_cnt = Signal(range(self.session_timeout + 1))
+            # Likewise, release may arrive before the read finishes.
+            release_pending = Signal(1)
+            close_session = Signal(1)
+
+        if self.busy_wait != BusyWait.POLL:
+            wait_cnt = Signal(range(self.max_backoff + 1))
+            delay = Signal(range(self.max_backoff + 1), reset=self.backoff)
 
         connect(m, self.seqmod.ctl, self._seq)
         connect(m, flipped(self.efb), self.seqmod.efb)
 
         m.d.comb += self.stream.data.eq(self._seq.rd.data.stream)
-
-        def drive_sequencer_poll_status():
+        m.d.comb += req.eq(self.stream.stb | stb_pending)
+
+        with m.If(take_stb):
+            m.d.sync += curr_op.eq(self.stream.op)
+            with m.If(self.stream.pages == 0):
+                m.d.sync += burst_pages.eq(self.pages)
+            with m.Else():
+                m.d.sync += burst_pages.eq(self.stream.pages)
+
+        # Present name to the Sequencer, framed as in COMMANDS. Fields that
+        # vary per request are driven by the state afterwards.
+        def drive_cmd(name):
+            (ops, op_len, data_len, xfer_is_wr) = COMMANDS[name]
             m.d.comb += [
-                self._seq.cmd.cmd.eq(Name.POLL_STATUS),
-                self._seq.cmd.ops.eq(0),
-                self._seq.op_len.eq(3),
+                self._seq.cmd.cmd.eq(name),
+                self._seq.cmd.ops.eq(ops or 0),
+                self._seq.op_len.eq(op_len),
                 self._seq.wr.data.eq(0),
-                self._seq.data_len.eq(4),
-                self._seq.xfer_is_wr.eq(0)
+                self._seq.data_len.eq(data_len or 0),
+                self._seq.xfer_is_wr.eq(xfer_is_wr)
             ]
 
+        # Entering one of cmd_states starts its command. req goes out along
+        # with the transition, rather than once the state has been entered,
+        # so that when one command follows another the Sequencer goes
+        # straight from WB_DISABLE_2 to WB_ENABLE_1.
+        cmd_states = {"ENABLE_CONFIG", "POLL_STATUS_1", "SET_UFM_ADDR",
+                      "READ_UFM", "PROGRAM_UFM", "ERASE_UFM", "CHECK_BUSY",
+                      "DISABLE_CONFIG", "BYPASS"}
+
+        def goto(state):
+            m.next = state
+            if state in cmd_states:
+                m.d.comb += self._seq.req.eq(1)
+
+        # Config interface is enabled, and the UFM isn't busy.
+        def start_request(op):
+            with m.If(op == Op.ERASE):
+                goto("ERASE_UFM")
+            with m.Elif((op == Op.READ) & ufm_addr_valid &
+                        (ufm_addr == self.stream.addr)):
+                goto("READ_UFM")
+            with m.Else():
+                goto("SET_UFM_ADDR")
+
+        def end_request():
+            if self.session_timeout is None:
+                goto("DISABLE_CONFIG")
+            else:
+                m.d.sync += idle_cnt.eq(self.session_timeout)
+                goto("SESSION")
+
+        # The UFM is busy; go back to check_state, either straight away or
+        # via wait_state.
+        def on_busy(check_state, wait_state):
+            m.d.comb += poll_retry.eq(1)
+            m.d.sync += retrying.eq(1)
+
+            if self.busy_wait == BusyWait.POLL:
+                goto(check_state)
+            elif self.busy_wait == BusyWait.BACKOFF:
+                m.d.sync += wait_cnt.eq(delay)
+                goto(wait_state)
+            else:
+                m.d.sync += wait_cnt.eq(self.max_backoff)
+                goto(wait_state)
+
+        def on_not_busy():
+            m.d.sync += [
+                retrying.eq(0),
+                busy_pending.eq(0)
+            ]
+
+            if self.busy_wait == BusyWait.BACKOFF:
+                m.d.sync += delay.eq(self.backoff)
+
+        def busy_wait_state(wait_state, check_state):
+            if self.busy_wait == BusyWait.POLL:
+                return
+
+            with m.State(wait_state):
+                drive_cmd(Name.IDLE)
+                m.d.sync += wait_cnt.eq(wait_cnt - 1)
+
+                if self.busy_wait == BusyWait.BACKOFF:
+                    with m.If(wait_cnt == 0):
+                        with m.If(delay < self.max_backoff // 2):
+                            m.d.sync += delay.eq(delay * 2)
+                        with m.Else():
+                            m.d.sync += delay.eq(self.max_backoff)
+                        goto(check_state)
+                else:
+                    with m.If((wait_cnt == 0) | self.efb.irq):
+                        goto(check_state)
+
         with m.FSM() as fsm:  # noqa: F841
             with m.State("IDLE"):
                 m.d.comb += self.stream.ready.eq(1)
-                m.d.comb += [
-                    self._seq.cmd.cmd.eq(Name.IDLE),
-                    self._seq.cmd.ops.constant.eq(0),
-                    self._seq.op_len.eq(0),
-                    self._seq.wr.data.eq(0),
-                    self._seq.data_len.eq(0),
-                    self._seq.xfer_is_wr.eq(1)
-                ]
+                drive_cmd(Name.IDLE)
 
-                with m.If(self.stream.stb):
-                    m.next = "ENABLE_CONFIG"
+                with m.If(req):
+                    m.d.comb += take_stb.eq(1)
+                    goto("ENABLE_CONFIG")
 
             with m.State("ENABLE_CONFIG"):
-                m.d.comb += self._seq.req.eq(just_entered)
-                m.d.comb += [
-                    self._seq.cmd.cmd.eq(Name.ENABLE_CONFIG),
-                    self._seq.cmd.ops.eq(0x080000),
-                    self._seq.op_len.eq(3),
-                    self._seq.wr.data.eq(0),
-                    self._seq.data_len.eq(0),
-                    self._seq.xfer_is_wr.eq(1)
-                ]
+                m.d.sync += ufm_addr_valid.eq(0)
+                drive_cmd(Name.ENABLE_CONFIG)
 
                 with m.If(self._seq.done):
-                    m.next = "POLL_STATUS_1"
+                    if self.poll_status:
+                        goto("POLL_STATUS_1")
+                    else:
+                        with m.If(busy_pending):
+                            goto("POLL_STATUS_1")
+                        with m.Else():
+                            start_request(curr_op)
 
             # Bleh... easier to make each data strobe an individual state.
             with m.State("POLL_STATUS_1"):
-                m.d.comb += self._seq.req.eq(just_entered)
-                drive_sequencer_poll_status()
+                drive_cmd(Name.POLL_STATUS)
 
                 with m.If(self._seq.rd.stb):
-                    m.next = "POLL_STATUS_2"
+                    goto("POLL_STATUS_2")
 
             with m.State("POLL_STATUS_2"):
-                drive_sequencer_poll_status()
+                drive_cmd(Name.POLL_STATUS)
 
                 with m.If(self._seq.rd.stb):
-                    m.next = "POLL_STATUS_3"
+                    goto("POLL_STATUS_3")
 
             with m.State("POLL_STATUS_3"):
-                drive_sequencer_poll_status()
+                drive_cmd(Name.POLL_STATUS)
                 with m.If(self._seq.rd.stb):
                     m.d.sync += ufm_busy.eq(self._seq.rd.data.status.busy)
 
                 with m.If(self._seq.rd.stb):
-                    m.next = "POLL_STATUS_4"
+                    goto("POLL_STATUS_4")
 
             with m.State("POLL_STATUS_4"):
-                drive_sequencer_poll_status()
+                drive_cmd(Name.POLL_STATUS)
 
                 with m.If(self._seq.rd.stb):
-                    m.next = "POLL_STATUS_5"
+                    goto("POLL_STATUS_5")
 
             with m.State("POLL_STATUS_5"):
-                drive_sequencer_poll_status()
+                drive_cmd(Name.POLL_STATUS)
 
                 with m.If(self._seq.done):
-                    m.next = "SET_UFM_ADDR"
                     with m.If(ufm_busy):
-                        m.next = "POLL_STATUS_1"
+                        on_busy("POLL_STATUS_1", "POLL_STATUS_WAIT")
+                    with m.Else():
+                        on_not_busy()
+                        start_request(curr_op)
+
+            busy_wait_state("POLL_STATUS_WAIT", "POLL_STATUS_1")
 
             with m.State("SET_UFM_ADDR"):
-                m.d.comb += self._seq.req.eq(just_entered)
+                drive_cmd(Name.SET_UFM_ADDR)
                 m.d.comb += [
-                    self._seq.cmd.cmd.eq(Name.SET_UFM_ADDR),
-                    self._seq.cmd.ops.eq(0),
-                    self._seq.op_len.eq(3),
                     self._seq.wr.data.set_ufm_addr.pages.eq(self.stream.addr),
-                    self._seq.wr.data.set_ufm_addr.space.eq(1),
-                    self._seq.data_len.eq(4),
-                    self._seq.xfer_is_wr.eq(1)
+                    self._seq.wr.data.set_ufm_addr.space.eq(1)
                 ]
 
                 with m.If(self._seq.done):
-                    m.next = "READ_UFM"
+                    m.d.sync += [
+                        pages_left.eq(burst_pages),
+                        ufm_addr.eq(self.stream.addr),
+                        ufm_addr_valid.eq(self.track_addr)
+                    ]
+                    with m.If(curr_op == Op.PROGRAM):
+                        goto("PROGRAM_UFM")
+                    with m.Else():
+                        goto("READ_UFM")
 
             with m.State("READ_UFM"):
-                m.d.comb += self._seq.req.eq(just_entered)
-                m.d.comb += self.stream.ack.eq(self._seq.rd.stb)
+                m.d.comb += self._seq.rd.ready.eq(~self.stream.stall)
+                m.d.comb += self.stream.ack.eq(self._seq.rd.stb & ~in_dummy)
+                drive_cmd(Name.READ_UFM)
                 m.d.comb += [
-                    self._seq.cmd.cmd.eq(Name.READ_UFM),
-                    self._seq.cmd.ops.read_ufm.pages.eq(1),
+                    self._seq.cmd.ops.read_ufm.pages.eq(burst_pages),
                     self._seq.cmd.ops.read_ufm.port.eq(1),
-                    self._seq.op_len.eq(3),
-                    self._seq.wr.data.eq(0),
-                    self._seq.data_len.eq(16),
-                    self._seq.xfer_is_wr.eq(0)
+                    self._seq.data_len.eq(burst_pages * (16 + self.dummy_bytes) -  # noqa: E501
+                                          self.dummy_bytes)
                 ]
 
+                # The first page has no dummy bytes in front of it; start
+                # the count as if they had already gone by.
+                m.d.comb += in_dummy.eq(page_cnt < self.dummy_bytes)
+                with m.If(just_entered):
+                    m.d.sync += [
+                        page_cnt.eq(self.dummy_bytes),
+                        pages_left.eq(burst_pages),
+                        page_drained.eq(0)
+                    ]
+                with m.Elif(self._seq.rd.stb):
+                    m.d.sync += page_cnt.eq(page_cnt + 1)
+                    with m.If(page_cnt == 16 + self.dummy_bytes - 1):
+                        m.d.sync += [
+                            page_cnt.eq(0),
+                            pages_left.eq(pages_left - 1),
+                            ufm_addr.eq(ufm_addr + 1)
+                        ]
+                        with m.If(pages_left == 1):
+                            m.d.sync += page_drained.eq(1)
+
                 with m.If(self._seq.done):
-                    m.next = "DISABLE_CONFIG"
+                    end_request()
 
-            with m.State("DISABLE_CONFIG"):
-                m.d.comb += self._seq.req.eq(just_entered)
+            with m.State("PROGRAM_UFM"):
+                m.d.sync += busy_pending.eq(1)
+                drive_cmd(Name.PROGRAM_UFM)
                 m.d.comb += [
-                    self._seq.cmd.cmd.eq(Name.DISABLE_CONFIG),
-                    self._seq.cmd.ops.disable.eq(0),
-                    self._seq.op_len.eq(2),
-                    self._seq.wr.data.eq(0),
-                    self._seq.data_len.eq(0),
-                    self._seq.xfer_is_wr.eq(1)
+                    self._seq.wr.data.stream.eq(self.stream.wr_data),
+                    self._seq.wr.valid.eq(self.stream.wr_valid),
+                    self.stream.wr_ready.eq(self._seq.wr.ready)
                 ]
 
                 with m.If(self._seq.done):
-                    m.next = "BYPASS"
+                    m.d.sync += [
+                        pages_left.eq(pages_left - 1),
+                        ufm_addr.eq(ufm_addr + 1)
+                    ]
+                    goto("CHECK_BUSY")
+
+            with m.State("ERASE_UFM"):
+                m.d.sync += [
+                    ufm_addr_valid.eq(0),
+                    busy_pending.eq(1)
+                ]
+                drive_cmd(Name.ERASE_UFM)
+
+                with m.If(self._seq.done):
+                    goto("CHECK_BUSY")
+
+            with m.State("CHECK_BUSY"):
+                drive_cmd(Name.CHECK_BUSY)
+
+                with m.If(self._seq.rd.stb):
+                    m.d.sync += ufm_busy.eq(self._seq.rd.data.busy_flag.busy)
+
+                with m.If(self._seq.done):
+                    goto("BUSY_CHECKED")
+
+            # Erase/program finished once the busy flag drops.
+            with m.State("BUSY_CHECKED"):
+                drive_cmd(Name.IDLE)
+
+                with m.If(ufm_busy):
+                    on_busy("CHECK_BUSY", "CHECK_BUSY_WAIT")
+                with m.Else():
+                    on_not_busy()
+                    with m.If((curr_op == Op.PROGRAM) & (pages_left != 0)):
+                        goto("PROGRAM_UFM")
+                    with m.Else():
+                        end_request()
+
+            busy_wait_state("CHECK_BUSY_WAIT", "CHECK_BUSY")
+
+            if self.session_timeout is not None:
+                # Config interface is still enabled; only SET_UFM_ADDR and
+                # READ_UFM are needed for the next page.
+                with m.State("SESSION"):
+                    m.d.comb += self.stream.ready.eq(1)
+                    drive_cmd(Name.IDLE)
+
+                    with m.If(req):
+                        m.d.comb += take_stb.eq(1)
+                        start_request(self.stream.op)
+                    with m.Elif(close_session | (idle_cnt == 0)):
+                        m.d.sync += release_pending.eq(0)
+                        goto("DISABLE_CONFIG")
+                    with m.Else():
+                        m.d.sync += idle_cnt.eq(idle_cnt - 1)
+
+            with m.State("DISABLE_CONFIG"):
+                drive_cmd(Name.DISABLE_CONFIG)
+
+                with m.If(self._seq.done):
+                    goto("BYPASS")
 
             with m.State("BYPASS"):
-                m.d.comb += self._seq.req.eq(just_entered)
-                with m.If(self._seq.done & ~self.stream.stb):
+                with m.If(self._seq.done & ~req):
                     m.d.comb += self.stream.ready.eq(1)
-                m.d.comb += [
-                    self._seq.cmd.cmd.eq(Name.BYPASS),
-                    self._seq.cmd.ops.eq(0),
-                    self._seq.op_len.eq(0),
-                    self._seq.wr.data.eq(0),
-                    self._seq.data_len.eq(0),
-                    self._seq.xfer_is_wr.eq(1)
-                ]
+                drive_cmd(Name.BYPASS)
 
                 with m.If(self._seq.done):
-                    m.next = "IDLE"
-                    with m.If(self.stream.stb):
-                        m.next = "ENABLE_CONFIG"
+                    goto("IDLE")
+                    with m.If(req):
+                        m.d.comb += take_stb.eq(1)
+                        goto("ENABLE_CONFIG")
+
+        if self.session_timeout is not None:
+            m.d.comb += close_session.eq(self.stream.release |
+                                         release_pending)
+            with m.If(self.stream.release & ~fsm.ongoing("IDLE") &
+                      ~fsm.ongoing("SESSION") &
+                      ~fsm.ongoing("DISABLE_CONFIG") &
+                      ~fsm.ongoing("BYPASS")):
+                m.d.sync += release_pending.eq(1)
+
+        m.d.comb += new_stb.eq(self.stream.stb &
+                               (~fsm.ongoing("READ_UFM") | page_drained))
+        with m.If(take_stb):
+            m.d.sync += stb_pending.eq(0)
+        with m.Elif(new_stb):
+            m.d.sync += stb_pending.eq(1)
+
+        if self.perf_en:
+            def ongoing(*states):
+                return Cat(fsm.ongoing(s) for s in states).any()
+
+            polling = ongoing(*(f"POLL_STATUS_{i}" for i in range(1, 6)))
+            busy_states = ["CHECK_BUSY", "BUSY_CHECKED"]
+            if self.busy_wait != BusyWait.POLL:
+                busy_states += ["CHECK_BUSY_WAIT", "POLL_STATUS_WAIT"]
+            idle_states = ["IDLE"]
+            if self.session_timeout is not None:
+                idle_states.append("SESSION")
+
+            m.d.comb += [
+                self.perf.idle.eq(ongoing(*idle_states)),
+                self.perf.setup.eq(
+                    ongoing("ENABLE_CONFIG", "SET_UFM_ADDR",
+                            "DISABLE_CONFIG", "BYPASS") |
+                    (polling & ~retrying)),
+                self.perf.data.eq(ongoing("READ_UFM", "PROGRAM_UFM",
+                                          "ERASE_UFM")),
+                self.perf.busy.eq(ongoing(*busy_states) |
+                                  (polling & retrying)),
+                self.perf.poll_retry.eq(poll_retry),
+                self.perf.wb_wait.eq(self.efb.cyc & self.efb.stb &
+                                     ~self.efb.ack)
+            ]
 
         prev_state = Signal.like(fsm.state)
         m.d.sync += prev_state.eq(fsm.state)